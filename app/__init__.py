@@ -9,8 +9,16 @@ def create_app(config_class=Config):
     # Ensure storage directories exist
     os.makedirs(app.config['TEMP_DIR'], exist_ok=True)
     os.makedirs(app.config['TRANSCRIPTS_DIR'], exist_ok=True)
+    os.makedirs(app.config['TRANSCRIPT_RECORDS_DIR'], exist_ok=True)
     
     from app.routes import main
     app.register_blueprint(main)
     
+    from app import metrics, tracing
+    metrics.init_app(app)
+    tracing.init_app(app)
+    
+    from app.catalog import rebuild_catalog_command
+    app.cli.add_command(rebuild_catalog_command)
+    
     return app 
\ No newline at end of file
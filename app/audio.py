@@ -0,0 +1,378 @@
+import os
+import json
+import math
+import subprocess
+import tempfile
+from typing import Iterator, Tuple
+import numpy as np
+
+FFMPEG_BIN = 'ffmpeg'
+FFPROBE_BIN = 'ffprobe'
+
+# Compressed codecs that can be cut with stream copy, mapped to the
+# container extension used for their chunks
+STREAM_COPY_EXTENSIONS = {
+    'mp3': 'mp3',
+    'aac': 'm4a',
+    'opus': 'ogg',
+    'vorbis': 'ogg',
+}
+
+# Silence detection runs on a cheap 8 kHz mono decode, in 100 ms frames
+ANALYSIS_SAMPLE_RATE = 8000
+ENERGY_FRAME_SECONDS = 0.1
+ENERGY_FRAMES_PER_BLOCK = 600  # One minute of audio per pipe read
+SILENCE_SMOOTHING_FRAMES = 5
+
+# Upload formats accepted by the Whisper API
+WHISPER_EXTENSIONS = {'flac', 'm4a', 'mp3', 'mp4', 'mpeg', 'mpga', 'oga', 'ogg', 'wav', 'webm'}
+
+# Leave room for container overhead and VBR drift below the upload limit
+CHUNK_SIZE_SAFETY_MARGIN = 0.9
+
+# Mono 16 kHz Opus tuned for speech (Whisper resamples to 16 kHz anyway). Constrained
+# VBR keeps chunk sizes close to the planned bitrate.
+SPEECH_CODEC_ARGS = ['-c:a', 'libopus', '-ac', '1', '-ar', '16000', '-application', 'voip', '-vbr', 'constrained']
+
+def probe_audio(audio_path: str) -> dict:
+    """Return codec, duration and bitrate of the first audio stream using ffprobe"""
+    cmd = [
+        FFPROBE_BIN, '-v', 'error',
+        '-select_streams', 'a:0',
+        '-show_entries', 'stream=codec_name,sample_rate,channels,bit_rate:format=duration,bit_rate',
+        '-of', 'json',
+        audio_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed for {audio_path}: {result.stderr.strip()}")
+
+    info = json.loads(result.stdout or '{}')
+    streams = info.get('streams') or []
+    if not streams:
+        raise RuntimeError(f"No audio stream found in {audio_path}")
+    stream = streams[0]
+    container = info.get('format', {})
+
+    return {
+        'codec_name': stream.get('codec_name'),
+        'sample_rate': int(stream.get('sample_rate') or 0),
+        'channels': int(stream.get('channels') or 0),
+        'bit_rate': int(stream.get('bit_rate') or container.get('bit_rate') or 0),
+        'duration': float(container.get('duration') or 0.0),
+    }
+
+def extract_audio(video_path: str, output_dir: str) -> str:
+    """Demux the audio track of a video without touching the video stream.
+
+    Audio that Whisper accepts as-is is stream-copied; anything else is
+    transcoded straight to 16 kHz mono Opus, which is compact and plenty for
+    speech recognition.
+    """
+    codec = probe_audio(video_path)['codec_name']
+    if codec in STREAM_COPY_EXTENSIONS:
+        extension = STREAM_COPY_EXTENSIONS[codec]
+        codec_args = ['-c:a', 'copy']
+    else:
+        extension = 'ogg'
+        codec_args = SPEECH_CODEC_ARGS + ['-b:a', '24k']
+
+    os.makedirs(output_dir, exist_ok=True)
+    audio_path = os.path.join(
+        output_dir,
+        f"{next(tempfile._get_candidate_names())}.{extension}"
+    )
+    cmd = [
+        FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-nostdin',
+        '-i', video_path,
+        '-map', '0:a:0', '-vn', '-sn', '-dn',
+        *codec_args,
+        audio_path
+    ]
+    print(f"Extracting audio from {video_path} ({codec} -> {extension})")
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        if os.path.exists(audio_path):
+            os.unlink(audio_path)
+        raise RuntimeError(f"ffmpeg failed to extract audio from {video_path}: {result.stderr.strip()}")
+    return audio_path
+
+def plan_chunks(audio_path: str, max_bytes: int, target_bit_rate: int, max_chunk_seconds: int = 0,
+                overlap_seconds: float = 0) -> dict:
+    """Pick an encoding and chunk length so that each chunk lands just under max_bytes.
+
+    Files Whisper accepts that already fit are sent as they are. Compressed
+    audio at or below the speech target bitrate is stream-copied; everything
+    else is transcoded to mono 16 kHz Opus at target_bit_rate, which fits far
+    more minutes of speech into each request. Chunks are spread evenly over the
+    file so the last one is not a tiny remainder. max_chunk_seconds optionally
+    caps chunk length to keep some parallelism, and overlap_seconds reserves
+    room for the audio repeated at the start of each chunk.
+    """
+    probe = probe_audio(audio_path)
+    file_size = os.path.getsize(audio_path)
+    duration = probe['duration']
+    budget = max_bytes * CHUNK_SIZE_SAFETY_MARGIN
+    extension = os.path.splitext(audio_path)[1].lstrip('.').lower()
+
+    if file_size <= budget and extension in WHISPER_EXTENSIONS and (
+            not max_chunk_seconds or duration <= max_chunk_seconds):
+        return {
+            'mode': 'passthrough',
+            'codec': probe['codec_name'],
+            'extension': extension,
+            'codec_args': [],
+            'bit_rate': probe['bit_rate'],
+            'duration': duration,
+            'chunk_seconds': math.ceil(duration),
+            'max_chunk_seconds': math.ceil(duration),
+            'num_chunks': 1,
+            'expected_bytes': file_size,
+        }
+
+    source_bit_rate = probe['bit_rate'] or (file_size * 8 / duration if duration else 0)
+    if probe['codec_name'] in STREAM_COPY_EXTENSIONS and 0 < source_bit_rate <= target_bit_rate:
+        mode = 'copy'
+        codec = probe['codec_name']
+        extension = STREAM_COPY_EXTENSIONS[codec]
+        bit_rate = source_bit_rate
+        codec_args = ['-c:a', 'copy']
+    else:
+        mode = 'transcode'
+        codec = 'opus'
+        extension = 'ogg'
+        bit_rate = target_bit_rate
+        codec_args = SPEECH_CODEC_ARGS + ['-b:a', str(target_bit_rate)]
+
+    # Container overhead is covered by the safety margin
+    longest_chunk = int(budget * 8 / bit_rate - overlap_seconds)
+    if max_chunk_seconds:
+        longest_chunk = min(longest_chunk, max_chunk_seconds)
+    num_chunks = max(1, math.ceil(duration / longest_chunk))
+    chunk_seconds = math.ceil(duration / num_chunks)
+
+    return {
+        'mode': mode,
+        'codec': codec,
+        'extension': extension,
+        'codec_args': codec_args,
+        'bit_rate': int(bit_rate),
+        'duration': duration,
+        'chunk_seconds': chunk_seconds,
+        'max_chunk_seconds': longest_chunk,
+        'num_chunks': num_chunks,
+        'expected_bytes': int(duration * bit_rate / 8),
+    }
+
+def iter_frame_energies(audio_path: str) -> Iterator[np.ndarray]:
+    """Yield the RMS energy of consecutive short frames, block by block.
+
+    ffmpeg decodes to low-rate mono PCM on a pipe and each block is reduced
+    to frame energies with NumPy, so only the energy envelope (ten values per
+    second) is ever held in memory.
+    """
+    frame_samples = int(ANALYSIS_SAMPLE_RATE * ENERGY_FRAME_SECONDS)
+    block_bytes = frame_samples * ENERGY_FRAMES_PER_BLOCK * 2  # s16le
+    cmd = [
+        FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-nostdin',
+        '-i', audio_path,
+        '-map', '0:a:0', '-vn',
+        '-ac', '1', '-ar', str(ANALYSIS_SAMPLE_RATE),
+        '-f', 's16le', 'pipe:1'
+    ]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            samples = np.frombuffer(data, dtype=np.int16)
+            usable = len(samples) - len(samples) % frame_samples
+            if not usable:
+                break
+            frames = samples[:usable].astype(np.float32).reshape(-1, frame_samples)
+            yield np.sqrt(np.mean(frames * frames, axis=1))
+
+        stderr = process.stderr.read().decode('utf-8', 'replace')
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {audio_path}: {stderr.strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+def find_quietest_point(energies: np.ndarray, offset: int, earliest: float, latest: float,
+                        target: float) -> float:
+    """Return the time in [earliest, latest] at the centre of the quietest stretch.
+
+    energies holds frame energies starting at frame index offset. The
+    envelope is smoothed so that a sustained pause wins over a single quiet
+    frame between two words, and among equally quiet pauses the one nearest
+    target is chosen so chunks stay close to their planned length.
+    """
+    first = max(int(earliest / ENERGY_FRAME_SECONDS) - offset, 0)
+    last = min(int(latest / ENERGY_FRAME_SECONDS) - offset, len(energies))
+    window = energies[first:last]
+    if len(window) == 0:
+        return latest
+
+    width = min(SILENCE_SMOOTHING_FRAMES, len(window))
+    padded = np.pad(window, (width // 2, (width - 1) // 2), mode='edge')
+    smoothed = np.convolve(padded, np.ones(width) / width, mode='valid')
+    quiet = smoothed <= smoothed.min() * 1.1 + 1.0
+    candidates = np.flatnonzero(quiet)
+    target_frame = int(target / ENERGY_FRAME_SECONDS) - offset - first
+    quietest = int(candidates[np.argmin(np.abs(candidates - target_frame))])
+
+    # Move to the middle of the pause that frame belongs to
+    run_start = quietest - int(np.argmin(quiet[quietest::-1])) + 1 if not quiet[:quietest + 1].all() else 0
+    run_end = quietest + int(np.argmin(quiet[quietest:])) if not quiet[quietest:].all() else len(quiet)
+    middle = first + (run_start + run_end) // 2
+    return (offset + middle + 0.5) * ENERGY_FRAME_SECONDS
+
+def cut_audio(audio_path: str, output_path: str, start: float, end: float, codec_args: list):
+    """Cut [start, end) seconds of audio to a new file with ffmpeg"""
+    cmd = [
+        FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-nostdin',
+        '-ss', f"{start:.3f}", '-t', f"{end - start:.3f}",
+        '-i', audio_path,
+        '-map', '0:a:0', '-vn',
+        *codec_args,
+        output_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to cut {audio_path} at {start:.1f}s: {result.stderr.strip()}")
+
+def iter_aligned_chunks(audio_path: str, output_dir: str, plan: dict, overlap_seconds: float,
+                        search_seconds: float) -> Iterator[Tuple[str, float]]:
+    """Cut chunks whose boundaries snap to the quietest point near each planned cut.
+
+    Boundaries are searched within search_seconds of the planned length,
+    never past the plan's size limit, while the energy envelope is still
+    streaming in, so chunk 0 is ready once its search window has been decoded
+    rather than after the whole file. Each chunk after the first starts
+    overlap_seconds before its boundary so words at the seam appear in both.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    prefix = os.path.join(output_dir, f"chunk_{next(tempfile._get_candidate_names())}")
+    print(f"Cutting {audio_path} into ~{plan['num_chunks']} silence-aligned chunks "
+          f"({plan['mode']} -> {plan['extension']}, {overlap_seconds}s overlap)")
+
+    frames = iter_frame_energies(audio_path)
+    energies = np.empty(0, dtype=np.float32)
+    offset = 0  # Frame index of energies[0]
+    exhausted = False
+    start = 0.0
+    index = 0
+
+    try:
+        while True:
+            latest = start + plan['max_chunk_seconds']
+            # Decode until the search window is covered or the audio ends
+            while not exhausted and (offset + len(energies)) * ENERGY_FRAME_SECONDS < latest:
+                block = next(frames, None)
+                if block is None:
+                    exhausted = True
+                else:
+                    energies = np.concatenate([energies, block])
+
+            decoded_end = (offset + len(energies)) * ENERGY_FRAME_SECONDS
+            if exhausted and decoded_end <= latest:
+                end = decoded_end
+            else:
+                target = start + plan['chunk_seconds']
+                end = find_quietest_point(energies, offset, max(start + 1, target - search_seconds),
+                                          min(target + search_seconds, latest), target)
+
+            chunk_path = f"{prefix}_{index:04d}.{plan['extension']}"
+            chunk_start = max(0.0, start - overlap_seconds)
+            cut_audio(audio_path, chunk_path, chunk_start, end, plan['codec_args'])
+            yield chunk_path, chunk_start
+
+            if exhausted and end >= decoded_end:
+                break
+
+            # Drop the envelope we no longer need to search
+            keep_from = int(end / ENERGY_FRAME_SECONDS) - offset
+            energies = energies[keep_from:]
+            offset += keep_from
+            start = end
+            index += 1
+    finally:
+        frames.close()
+
+def iter_audio_chunks(audio_path: str, output_dir: str, plan: dict, overlap_seconds: float = 0,
+                      align_to_silence: bool = False, search_seconds: float = 30) -> Iterator[Tuple[str, float]]:
+    """Cut an audio file into chunks following a plan from plan_chunks.
+
+    Yields (chunk path, start time in seconds) pairs as soon as each chunk
+    is written, so callers can
+    start working on the first chunk while the rest are still being cut. The
+    audio is never decoded into Python memory: ffmpeg either stream-copies or
+    transcodes it itself. Fixed-length cuts use the ffmpeg segment muxer;
+    silence alignment or overlap go through iter_aligned_chunks.
+    """
+    if plan['mode'] == 'passthrough':
+        yield audio_path, 0.0
+        return
+
+    if align_to_silence or overlap_seconds:
+        yield from iter_aligned_chunks(
+            audio_path,
+            output_dir,
+            plan,
+            overlap_seconds,
+            search_seconds if align_to_silence else 0
+        )
+        return
+
+    extension = plan['extension']
+    chunk_seconds = plan['chunk_seconds']
+    codec_args = plan['codec_args']
+
+    os.makedirs(output_dir, exist_ok=True)
+    pattern = os.path.join(
+        output_dir,
+        f"chunk_{next(tempfile._get_candidate_names())}_%04d.{extension}"
+    )
+    cmd = [
+        FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-nostdin',
+        '-i', audio_path,
+        '-map', '0:a:0', '-vn',
+        *codec_args,
+        '-f', 'segment',
+        '-segment_time', str(chunk_seconds),
+        '-reset_timestamps', '1',
+        # ffmpeg appends each finished segment and its start time to the list, read from stdout
+        '-segment_list', 'pipe:1',
+        '-segment_list_type', 'csv',
+        pattern
+    ]
+    print(f"Cutting {audio_path} into {plan['num_chunks']} chunks of {chunk_seconds}s ({plan['mode']} -> {extension})")
+
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    try:
+        for line in process.stdout:
+            if line.strip():
+                segment_name, segment_start, _ = line.strip().rsplit(',', 2)
+                yield os.path.join(output_dir, os.path.basename(segment_name)), float(segment_start)
+
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to split {audio_path}: {stderr.strip()}")
+    finally:
+        # Stop ffmpeg if the consumer gave up early
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+from typing import Optional
+import redis
+from flask import current_app
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+_transcript_cache = None
+_llm_cache = None
+
+def hash_file(path: str) -> str:
+    """Return the SHA-256 hex digest of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class TranscriptCache:
+    """Content-addressed disk cache for transcripts and per-chunk transcriptions.
+
+    Entries are stored as text files under cache_dir and tracked in an SQLite
+    index holding their size and last access time, which drives LRU eviction
+    once the cache grows past max_bytes. SQLite makes the index safe to share
+    between worker processes on the same host.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, 'index.sqlite3')
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('''CREATE TABLE IF NOT EXISTS entries (
+                path TEXT PRIMARY KEY,
+                key TEXT NOT NULL,
+                chunk INTEGER,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            )''')
+            db.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+            db.execute('CREATE INDEX IF NOT EXISTS entries_key ON entries (key)')
+            db.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    def _connect(self):
+        # A fresh connection per operation keeps the cache usable from worker threads
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    @staticmethod
+    def make_key(audio_hash: str, **params) -> str:
+        """Build a cache key from the audio hash and the parameters that shape the output"""
+        material = json.dumps({'audio': audio_hash, **params}, sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str, chunk: Optional[int] = None) -> str:
+        name = f"{key}.txt" if chunk is None else f"{key}.chunk{chunk}.txt"
+        return os.path.join(self.cache_dir, key[:2], name)
+
+    def _count(self, db, name: str):
+        db.execute(
+            'INSERT INTO counters (name, value) VALUES (?, 1) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + 1',
+            (name,)
+        )
+
+    def _get(self, key: str, chunk: Optional[int], counter: str) -> Optional[str]:
+        path = self._path(key, chunk)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            text = None
+
+        with self._connect() as db:
+            if text is None:
+                self._count(db, f"{counter}_misses")
+            else:
+                self._count(db, f"{counter}_hits")
+                db.execute('UPDATE entries SET accessed = ? WHERE path = ?', (time.time(), path))
+        return text
+
+    def _put(self, key: str, chunk: Optional[int], text: str):
+        path = self._path(key, chunk)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = text.encode('utf-8')
+
+        # Write to a temp file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._connect() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO entries (path, key, chunk, size, accessed) VALUES (?, ?, ?, ?, ?)',
+                (path, key, chunk, len(data), time.time())
+            )
+        self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        with self._connect() as db:
+            total = db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for path, size in db.execute('SELECT path, size FROM entries ORDER BY accessed').fetchall():
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                db.execute('DELETE FROM entries WHERE path = ?', (path,))
+                self._count(db, 'evictions')
+                total -= size
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached transcript for a key, or None"""
+        return self._get(key, None, 'transcript')
+
+    def put(self, key: str, text: str):
+        """Store a complete transcript and drop the chunk entries it supersedes"""
+        self._put(key, None, text)
+        with self._connect() as db:
+            for (path,) in db.execute('SELECT path FROM entries WHERE key = ? AND chunk IS NOT NULL', (key,)).fetchall():
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            db.execute('DELETE FROM entries WHERE key = ? AND chunk IS NOT NULL', (key,))
+
+    def get_chunk(self, key: str, chunk: int) -> Optional[str]:
+        """Return the cached transcription of one chunk, or None"""
+        return self._get(key, chunk, 'chunk')
+
+    def put_chunk(self, key: str, chunk: int, text: str):
+        """Store the transcription of one chunk"""
+        self._put(key, chunk, text)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current size of the cache"""
+        with self._connect() as db:
+            stats = dict(db.execute('SELECT name, value FROM counters').fetchall())
+            entries, size = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        stats.update({'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes})
+        return stats
+
+def get_transcript_cache() -> TranscriptCache:
+    """Return the process-wide transcript cache"""
+    global _transcript_cache
+    if _transcript_cache is None:
+        _transcript_cache = TranscriptCache(
+            current_app.config['TRANSCRIPT_CACHE_DIR'],
+            current_app.config['TRANSCRIPT_CACHE_MAX_BYTES']
+        )
+    return _transcript_cache
+
+def llm_cache_key(prompt_template: str, model: str, temperature: float, text: str) -> str:
+    """Cache key for one LLM call on one chunk of text"""
+    material = json.dumps({
+        'template': hashlib.sha256(prompt_template.encode('utf-8')).hexdigest(),
+        'model': model,
+        'temperature': temperature,
+        'text': hashlib.sha256(text.encode('utf-8')).hexdigest(),
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+class RedisLLMCache:
+    """LLM response cache stored in Redis.
+
+    Values expire after ttl seconds; a sorted set of last access times bounds
+    the cache to max_entries by evicting the least recently used keys.
+    """
+
+    def __init__(self, client, ttl: int, max_entries: int, prefix: str = 'llmcache'):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self.lru_key = f"{prefix}:lru"
+        self.counters_key = f"{prefix}:counters"
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self._key(key))
+        pipe = self.client.pipeline()
+        if value is None:
+            pipe.hincrby(self.counters_key, 'misses', 1)
+        else:
+            pipe.hincrby(self.counters_key, 'hits', 1)
+            pipe.zadd(self.lru_key, {key: time.time()})
+            pipe.expire(self._key(key), self.ttl)
+        pipe.execute()
+        return value.decode('utf-8') if value is not None else None
+
+    def put(self, key: str, value: str):
+        pipe = self.client.pipeline()
+        pipe.set(self._key(key), value.encode('utf-8'), ex=self.ttl)
+        pipe.zadd(self.lru_key, {key: time.time()})
+        pipe.zcard(self.lru_key)
+        size = pipe.execute()[-1]
+
+        if size > self.max_entries:
+            # Trims keys that already expired from the index along with the LRU tail
+            evicted = [k.decode('utf-8') for k, _ in self.client.zpopmin(self.lru_key, size - self.max_entries)]
+            pipe = self.client.pipeline()
+            pipe.delete(*[self._key(k) for k in evicted])
+            pipe.hincrby(self.counters_key, 'evictions', len(evicted))
+            pipe.execute()
+
+    def stats(self) -> dict:
+        stats = {k.decode('utf-8'): int(v) for k, v in self.client.hgetall(self.counters_key).items()}
+        stats.update({'backend': 'redis', 'entries': self.client.zcard(self.lru_key), 'max_entries': self.max_entries})
+        return stats
+
+class SQLiteLLMCache:
+    """LLM response cache in a local SQLite file, used when Redis is unavailable"""
+
+    def __init__(self, path: str, ttl: int, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('''CREATE TABLE IF NOT EXISTS llm_entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires REAL NOT NULL,
+                accessed REAL NOT NULL
+            )''')
+            db.execute('CREATE INDEX IF NOT EXISTS llm_entries_accessed ON llm_entries (accessed)')
+            db.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _count(self, db, name: str, amount: int = 1):
+        db.execute(
+            'INSERT INTO counters (name, value) VALUES (?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+            (name, amount)
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute('SELECT value FROM llm_entries WHERE key = ? AND expires > ?', (key, now)).fetchone()
+            if row is None:
+                self._count(db, 'misses')
+                return None
+            db.execute('UPDATE llm_entries SET accessed = ?, expires = ? WHERE key = ?', (now, now + self.ttl, key))
+            self._count(db, 'hits')
+            return row[0]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO llm_entries (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                (key, value, now + self.ttl, now)
+            )
+            db.execute('DELETE FROM llm_entries WHERE expires <= ?', (now,))
+            size = db.execute('SELECT COUNT(*) FROM llm_entries').fetchone()[0]
+            if size > self.max_entries:
+                db.execute(
+                    'DELETE FROM llm_entries WHERE key IN '
+                    '(SELECT key FROM llm_entries ORDER BY accessed LIMIT ?)',
+                    (size - self.max_entries,)
+                )
+                self._count(db, 'evictions', size - self.max_entries)
+
+    def stats(self) -> dict:
+        with self._connect() as db:
+            stats = dict(db.execute('SELECT name, value FROM counters').fetchall())
+            entries = db.execute('SELECT COUNT(*) FROM llm_entries').fetchone()[0]
+        stats.update({'backend': 'sqlite', 'entries': entries, 'max_entries': self.max_entries})
+        return stats
+
+def get_llm_cache():
+    """Return the process-wide LLM cache, falling back to SQLite if Redis is unreachable"""
+    global _llm_cache
+    if _llm_cache is None:
+        config = current_app.config
+        if config['LLM_CACHE_BACKEND'] == 'redis':
+            try:
+                client = redis.from_url(config['LLM_CACHE_REDIS_URL'])
+                client.ping()
+                _llm_cache = RedisLLMCache(client, config['LLM_CACHE_TTL'], config['LLM_CACHE_MAX_ENTRIES'])
+            except redis.RedisError as e:
+                print(f"Redis unavailable for LLM cache, falling back to SQLite: {e}")
+        if _llm_cache is None:
+            _llm_cache = SQLiteLLMCache(
+                config['LLM_CACHE_SQLITE_PATH'],
+                config['LLM_CACHE_TTL'],
+                config['LLM_CACHE_MAX_ENTRIES']
+            )
+    return _llm_cache
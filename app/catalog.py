@@ -0,0 +1,355 @@
+import os
+import re
+import html
+import json
+import time
+import sqlite3
+import hashlib
+from datetime import datetime
+from typing import Iterable, List, Optional
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+TITLE_PATTERN = re.compile(r'^# (?:Bilingual )?Transcript: (.+)$', re.M)
+GENERATED_PATTERN = re.compile(r'^(?:Generated on:|- \*\*Generated:\*\*) (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})', re.M)
+SECTION_PATTERNS = {
+    'english': re.compile(r'^## (?:English )?Content\s*$', re.M),
+    'chinese': re.compile(r'^## Chinese Content', re.M),
+}
+CHINESE_HEADING_PATTERN = re.compile(r'^## Chinese Content.*$', re.M)
+SORT_COLUMNS = ('created_at', 'original_name', 'duration', 'size')
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# FTS5's unicode61 tokenizer treats a run of CJK characters as one token, so
+# CJK text is indexed one character per token and searched as phrases
+CJK_CHARS = '\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef'
+CJK_BOUNDARY_PATTERN = re.compile(f'(?<=[{CJK_CHARS}])|(?=[{CJK_CHARS}])')
+CJK_SPACING_PATTERN = re.compile(f'(?<=[{CJK_CHARS}])([\x02\x03]?) +(?=[\x02\x03]?[{CJK_CHARS}])')
+CJK_PATTERN = re.compile(f'[{CJK_CHARS}]')
+HIGHLIGHT_START, HIGHLIGHT_END = '\x02', '\x03'
+SNIPPET_TOKENS = 24
+SEARCH_WEIGHTS = (5.0, 1.0, 1.0)  # original_name, english, chinese
+
+_catalog = None
+
+def parse_transcript(filename: str, content: str) -> dict:
+    """Read the original name, generation time and language sections from a transcript"""
+    title = TITLE_PATTERN.search(content)
+    generated = GENERATED_PATTERN.search(content)
+    return {
+        'original_name': title.group(1).strip() if title else filename.rsplit('_', 1)[0],
+        'created_at': datetime.strptime(generated.group(1), DATE_FORMAT).timestamp() if generated else None,
+        'sections': [name for name, pattern in SECTION_PATTERNS.items() if pattern.search(content)],
+    }
+
+def split_sections(content: str) -> tuple[str, str]:
+    """Split a transcript into its English and Chinese text, without the headers"""
+    english = SECTION_PATTERNS['english'].search(content)
+    chinese = CHINESE_HEADING_PATTERN.search(content)
+    start = english.end() if english else 0
+    if not chinese:
+        return content[start:], ''
+    return content[start:chinese.start()], content[chinese.end():]
+
+def space_cjk(text: str) -> str:
+    return CJK_BOUNDARY_PATTERN.sub(' ', text)
+
+def searchable(text: str) -> str:
+    """Text as indexed for search, without the markers snippet() highlights with"""
+    return space_cjk(text.replace(HIGHLIGHT_START, '').replace(HIGHLIGHT_END, ''))
+
+def unspace_cjk(text: str) -> str:
+    return CJK_SPACING_PATTERN.sub(r'\1', text)
+
+def build_match_query(query: str) -> str:
+    """Turn user input into an FTS5 query that requires every term.
+
+    Terms are quoted so FTS5 syntax in the input is matched literally, and
+    CJK terms become phrases of their characters.
+    """
+    terms = []
+    for term in query.split():
+        if CJK_PATTERN.search(term):
+            term = ' '.join(space_cjk(term).split())
+        terms.append('"' + term.replace('"', '""') + '"')
+    return ' '.join(terms)
+
+class TranscriptCatalog:
+    """SQLite index of the stored transcripts.
+
+    Rows are written whenever a transcript is saved or updated, so listing
+    the archive is a single indexed query instead of a directory scan.
+    Transcripts stored as layers are indexed from their layers, and an
+    update re-indexes only the section it changed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('''CREATE TABLE IF NOT EXISTS transcripts (
+                id INTEGER PRIMARY KEY,
+                filename TEXT UNIQUE NOT NULL,
+                original_name TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                duration REAL,
+                size INTEGER NOT NULL,
+                sections TEXT NOT NULL,
+                content_hash TEXT NOT NULL
+            )''')
+            for column in SORT_COLUMNS:
+                db.execute(f'CREATE INDEX IF NOT EXISTS transcripts_{column} ON transcripts ({column}, id)')
+            
+            # A search table added to an existing catalog starts empty and needs a rebuild
+            has_search = db.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'transcript_search'"
+            ).fetchone() is not None
+            db.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS transcript_search USING fts5(
+                original_name, english, chinese, tokenize = 'unicode61'
+            )''')
+            self.needs_rebuild = not has_search and db.execute(
+                'SELECT EXISTS (SELECT 1 FROM transcripts)'
+            ).fetchone()[0] == 1
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _upsert(self, db, filename: str, original_name: str, created_at: float, duration: Optional[float],
+                size: int, sections: List[str], content_hash: str, english: str, chinese: str):
+        now = time.time()
+        # Updates keep the original creation time and any duration already known
+        db.execute(
+            '''INSERT INTO transcripts
+                   (filename, original_name, created_at, updated_at, duration, size, sections, content_hash)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(filename) DO UPDATE SET
+                   updated_at = excluded.updated_at,
+                   duration = COALESCE(excluded.duration, duration),
+                   size = excluded.size,
+                   sections = excluded.sections,
+                   content_hash = excluded.content_hash''',
+            (filename, original_name, created_at or now, now, duration, size, json.dumps(sections), content_hash)
+        )
+        
+        # The search row shares the catalog row's id and is replaced with it
+        transcript_id, name = db.execute(
+            'SELECT id, original_name FROM transcripts WHERE filename = ?', (filename,)
+        ).fetchone()
+        db.execute('DELETE FROM transcript_search WHERE rowid = ?', (transcript_id,))
+        db.execute(
+            'INSERT INTO transcript_search (rowid, original_name, english, chinese) VALUES (?, ?, ?, ?)',
+            (transcript_id, searchable(name), searchable(english), searchable(chinese))
+        )
+
+    def _record(self, db, filename: str, content: str, original_name: Optional[str],
+                duration: Optional[float], created_at: Optional[float]):
+        parsed = parse_transcript(filename, content)
+        encoded = content.encode('utf-8')
+        english, chinese = split_sections(content)
+        self._upsert(db, filename, original_name or parsed['original_name'], created_at or parsed['created_at'],
+                     duration, len(encoded), parsed['sections'], hashlib.sha256(encoded).hexdigest(),
+                     english, chinese)
+
+    def record(self, filename: str, content: str, original_name: str = None,
+               duration: float = None, created_at: float = None):
+        """Add or refresh the entry for a markdown transcript from its current content"""
+        with self._connect() as db:
+            self._record(db, filename, content, original_name, duration, created_at)
+
+    def _record_layers(self, db, record: dict):
+        english, chinese = record['english'], record['chinese']
+        digest = hashlib.sha256()
+        for text in (english, chinese):
+            digest.update(hashlib.sha256(text.encode('utf-8')).digest())
+        self._upsert(db, record['filename'], record['original_name'], record['created_at'], record['duration'],
+                     record['size'], record['sections'], digest.hexdigest(), english, chinese)
+
+    def record_layers(self, record: dict):
+        """Add or refresh the entry for a transcript stored as layers.
+
+        record holds the filename, original_name, created_at (a timestamp),
+        duration, the english and chinese text as shown, and the size and
+        sections of the markdown they render to.
+        """
+        with self._connect() as db:
+            self._record_layers(db, record)
+
+    def update_section(self, filename: str, section: str, text: str, size: int, sections: List[str]) -> bool:
+        """Re-index one section of a transcript without touching the other.
+
+        The content hash is chained from the previous one, so it still
+        changes with every update. Returns False when the transcript is not
+        in the catalog yet.
+        """
+        if section not in SECTION_PATTERNS:
+            raise ValueError(f"Unknown section: {section}")
+        with self._connect() as db:
+            row = db.execute(
+                'SELECT id, content_hash FROM transcripts WHERE filename = ?', (filename,)
+            ).fetchone()
+            if row is None:
+                return False
+            transcript_id, content_hash = row
+            digest = hashlib.sha256(f"{content_hash}:{section}:".encode('utf-8'))
+            digest.update(hashlib.sha256(text.encode('utf-8')).digest())
+            db.execute(
+                'UPDATE transcripts SET updated_at = ?, size = ?, sections = ?, content_hash = ? WHERE id = ?',
+                (time.time(), size, json.dumps(sections), digest.hexdigest(), transcript_id)
+            )
+            # FTS5 rewrites the row's other columns from its own copy, so only this text is read here
+            db.execute(f'UPDATE transcript_search SET {section} = ? WHERE rowid = ?',
+                       (searchable(text), transcript_id))
+        return True
+
+    def remove(self, filename: str):
+        with self._connect() as db:
+            db.execute(
+                'DELETE FROM transcript_search WHERE rowid IN (SELECT id FROM transcripts WHERE filename = ?)',
+                (filename,)
+            )
+            db.execute('DELETE FROM transcripts WHERE filename = ?', (filename,))
+
+    @staticmethod
+    def _row_to_dict(row) -> dict:
+        filename, original_name, created_at, duration, size, sections, content_hash = row
+        return {
+            'filename': filename,
+            'original_name': original_name,
+            'created_at': datetime.fromtimestamp(created_at).strftime(DATE_FORMAT),
+            'duration': duration,
+            'size': size,
+            'sections': json.loads(sections),
+            'content_hash': content_hash,
+        }
+
+    def version(self) -> str:
+        """A token that changes whenever a transcript is added, updated or removed"""
+        with self._connect() as db:
+            count, last_id, last_update = db.execute(
+                'SELECT COUNT(*), COALESCE(MAX(id), 0), COALESCE(MAX(updated_at), 0) FROM transcripts'
+            ).fetchone()
+        return f"{count}-{last_id}-{last_update:.6f}"
+
+    def get(self, filename: str) -> Optional[dict]:
+        with self._connect() as db:
+            row = db.execute(
+                'SELECT filename, original_name, created_at, duration, size, sections, content_hash '
+                'FROM transcripts WHERE filename = ?',
+                (filename,)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list(self, page: int, per_page: int, sort: str = 'created_at', descending: bool = True) -> tuple[List[dict], int]:
+        """Return one page of transcripts and the total count"""
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort}")
+        direction = 'DESC' if descending else 'ASC'
+        with self._connect() as db:
+            total = db.execute('SELECT COUNT(*) FROM transcripts').fetchone()[0]
+            rows = db.execute(
+                'SELECT filename, original_name, created_at, duration, size, sections, content_hash '
+                f'FROM transcripts ORDER BY {sort} {direction}, id {direction} LIMIT ? OFFSET ?',
+                (per_page, (page - 1) * per_page)
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows], total
+
+    def rebuild(self, transcripts_dir: str, records: Iterable[dict] = ()) -> int:
+        """Re-index every transcript and drop entries whose transcript is gone.
+
+        records are the transcripts stored as layers, as taken by
+        record_layers. Markdown files in transcripts_dir are only parsed for
+        transcripts saved before layers existed.
+        """
+        filenames = set()
+        with self._connect() as db:
+            for record in records:
+                self._record_layers(db, record)
+                filenames.add(record['filename'])
+            for filename in sorted(os.listdir(transcripts_dir)):
+                if not filename.endswith('.md') or filename in filenames:
+                    continue
+                file_path = os.path.join(transcripts_dir, filename)
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                # Files without a generation line fall back to their ctime
+                created_at = None if GENERATED_PATTERN.search(content) else os.path.getctime(file_path)
+                self._record(db, filename, content, None, None, created_at)
+                filenames.add(filename)
+            db.execute('CREATE TEMP TABLE present (filename TEXT PRIMARY KEY)')
+            db.executemany('INSERT INTO present VALUES (?)', ((name,) for name in filenames))
+            db.execute(
+                'DELETE FROM transcript_search WHERE rowid IN '
+                '(SELECT id FROM transcripts WHERE filename NOT IN (SELECT filename FROM present))'
+            )
+            db.execute('DELETE FROM transcripts WHERE filename NOT IN (SELECT filename FROM present)')
+        self.needs_rebuild = False
+        return len(filenames)
+
+    def search(self, query: str, limit: int, offset: int = 0) -> List[dict]:
+        """Rank transcripts matching every term of query, best first, with an HTML snippet"""
+        match_query = build_match_query(query)
+        if not match_query:
+            return []
+        with self._connect() as db:
+            rows = db.execute(
+                f'''SELECT t.filename, t.original_name, t.created_at,
+                          snippet(transcript_search, -1, ?, ?, '…', {SNIPPET_TOKENS}),
+                          bm25(transcript_search, {', '.join(map(str, SEARCH_WEIGHTS))}) AS score
+                   FROM transcript_search JOIN transcripts t ON t.id = transcript_search.rowid
+                   WHERE transcript_search MATCH ?
+                   ORDER BY score LIMIT ? OFFSET ?''',
+                (HIGHLIGHT_START, HIGHLIGHT_END, match_query, limit, offset)
+            ).fetchall()
+        
+        results = []
+        for filename, original_name, created_at, snippet, score in rows:
+            snippet = html.escape(unspace_cjk(' '.join(snippet.split())))
+            results.append({
+                'filename': filename,
+                'original_name': original_name,
+                'created_at': datetime.fromtimestamp(created_at).strftime(DATE_FORMAT),
+                'snippet': snippet.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'),
+                'score': -score,
+            })
+        return results
+
+def rebuild_catalog(catalog: TranscriptCatalog) -> int:
+    from app.transcripts import iter_records
+    return catalog.rebuild(current_app.config['TRANSCRIPTS_DIR'], iter_records())
+
+def get_catalog() -> TranscriptCatalog:
+    """Return the process-wide catalog, backfilling it from disk when first created"""
+    global _catalog
+    if _catalog is None:
+        path = current_app.config['CATALOG_PATH']
+        is_new = not os.path.exists(path)
+        _catalog = TranscriptCatalog(path)
+        if is_new or _catalog.needs_rebuild:
+            count = rebuild_catalog(_catalog)
+            print(f"Indexed {count} existing transcripts")
+    return _catalog
+
+def record_transcript(record: dict):
+    """Index a transcript stored as layers; the layers stay the source of truth if this fails"""
+    try:
+        get_catalog().record_layers(record)
+    except sqlite3.Error as e:
+        print(f"Error indexing transcript {record['filename']}: {e}")
+
+def update_transcript_section(filename: str, section: str, text: str, size: int, sections: List[str]) -> bool:
+    """Re-index one section of a transcript, returning False if it needs a full record instead"""
+    try:
+        return get_catalog().update_section(filename, section, text, size, sections)
+    except sqlite3.Error as e:
+        print(f"Error indexing transcript {filename}: {e}")
+        return True
+
+@click.command('rebuild-catalog')
+@with_appcontext
+def rebuild_catalog_command():
+    """Rebuild the transcript catalog from the stored transcripts."""
+    count = rebuild_catalog(get_catalog())
+    click.echo(f"Indexed {count} transcripts")
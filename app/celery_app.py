@@ -1,10 +1,36 @@
-from celery import Celery
+from celery import Celery, Task
+from celery.signals import worker_process_init, worker_process_shutdown
+from flask import has_app_context
 from config import Config
 
+_worker_app = None
+
+def get_worker_app():
+    """The Flask app tasks run in, created once per process"""
+    global _worker_app
+    if _worker_app is None:
+        from app import create_app
+        _worker_app = create_app()
+    return _worker_app
+
+class AppContextTask(Task):
+    """Run every task inside the process's app context, or the caller's when eager.
+
+    The task body is called through run(), as Task.__call__ would push a
+    second request without the task id over the one the worker set up.
+    """
+
+    def __call__(self, *args, **kwargs):
+        if has_app_context():
+            return self.run(*args, **kwargs)
+        with get_worker_app().app_context():
+            return self.run(*args, **kwargs)
+
 # Initialize celery
 celery = Celery('app',
                 broker=Config.CELERY_BROKER_URL,
-                backend=Config.CELERY_RESULT_BACKEND)
+                backend=Config.CELERY_RESULT_BACKEND,
+                task_cls=AppContextTask)
 
 # Optional Configuration
 celery.conf.update(
@@ -12,5 +38,25 @@ celery.conf.update(
     task_track_started=True
 )
 
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    """Build the app and the shared OpenAI client before the first task arrives"""
+    from app.utils import get_openai_client
+    with get_worker_app().app_context():
+        try:
+            get_openai_client()
+        except ValueError as e:
+            print(f"OpenAI client not created: {e}")
+
+@worker_process_shutdown.connect
+def close_worker_process(**kwargs):
+    from app.utils import close_openai_client
+    close_openai_client()
+
+# Queue wait and peak memory of every task, and the trace each one belongs to
+from app import metrics, tracing
+metrics.connect_celery_signals()
+tracing.connect_celery_signals()
+
 # Import celery tasks
-import app.tasks
\ No newline at end of file
+import app.tasks
@@ -0,0 +1,158 @@
+import re
+import math
+from typing import Callable, List
+from config import Config
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to an estimate
+    tiktoken = None
+    print("tiktoken is not installed, LLM chunks are sized by an estimate of their tokens")
+
+CHARS_PER_TOKEN = 4  # Rough average for English text
+CJK_PATTERN = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]')
+# Abbreviations whose trailing period does not end a sentence
+ABBREVIATIONS = {
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'vs', 'etc', 'e.g', 'i.e', 'cf', 'al',
+    'fig', 'eq', 'no', 'vol', 'approx', 'inc', 'ltd', 'co', 'jan', 'feb', 'mar', 'apr', 'jun',
+    'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec',
+}
+# A sentence ends after CJK end punctuation, or after .!? followed by whitespace.
+# Closing quotes and brackets stay with the sentence they close.
+SENTENCE_END = re.compile(r'[。！？；]+[」』”’)）]*\s*|[.!?]+[\'"”’)\]]*\s+|\n\s*\n\s*')
+# Break points inside a sentence too long for one chunk
+CLAUSE_END = re.compile(r'[,;:，、：]\s*|\s+')
+
+_encoding = None
+
+def get_encoding():
+    """The tokenizer of the LLM, or None when tiktoken or its encoding file is unavailable"""
+    global _encoding
+    if _encoding is None:
+        _encoding = False
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(Config.TOKENIZER_ENCODING)
+            except Exception as e:
+                # The encoding is downloaded on first use, which fails on offline workers
+                print(f"Could not load tokenizer {Config.TOKENIZER_ENCODING}, estimating tokens: {e}")
+    return _encoding or None
+
+def estimate_tokens(text: str) -> int:
+    """Upper-end token estimate: one token per CJK character, CHARS_PER_TOKEN for the rest"""
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / CHARS_PER_TOKEN)
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, keeping each one's trailing whitespace so they join back losslessly.
+
+    Decimals, URLs and version numbers have no space after their periods and
+    are never split; known abbreviations and single initials are not treated
+    as sentence ends.
+    """
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        end = match.end()
+        if match.group().startswith('.'):
+            word = text[start:match.start()].rsplit(None, 1)[-1:] or ['']
+            word = word[0].lower()
+            if word in ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+                continue
+        sentences.append(text[start:end])
+        start = end
+    if start < len(text):
+        sentences.append(text[start:])
+    return sentences
+
+def split_oversized(sentence: str, max_tokens: int, count: Callable[[str], int]) -> List[str]:
+    """Break a sentence over the budget after punctuation or spaces, or inside unspaced runs"""
+    pieces = []
+    start = 0
+    for match in CLAUSE_END.finditer(sentence):
+        pieces.append(sentence[start:match.end()])
+        start = match.end()
+    if start < len(sentence):
+        pieces.append(sentence[start:])
+
+    parts = []
+    current = ''
+    current_tokens = 0
+    for piece in pieces:
+        tokens = count(piece)
+        if tokens > max_tokens:
+            # Unspaced text, such as a long run of Chinese without punctuation
+            step = max(1, len(piece) * max_tokens // (2 * tokens))
+            subpieces = [piece[i:i + step] for i in range(0, len(piece), step)]
+        else:
+            subpieces = [piece]
+        for part in subpieces:
+            tokens = count(part) if len(subpieces) > 1 else tokens
+            if current and current_tokens + tokens > max_tokens:
+                parts.append(current)
+                current = ''
+                current_tokens = 0
+            current += part
+            current_tokens += tokens
+    if current:
+        parts.append(current)
+    return parts
+
+def chunk_text(text: str, max_tokens: int, count: Callable[[str], int] = None) -> List[str]:
+    """Pack whole sentences into chunks of at most max_tokens tokens each.
+
+    Chunks are filled greedily in order, so all but the last come close to
+    the budget. A single sentence over the budget is split on its own.
+    """
+    count = count or count_tokens
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for sentence in split_sentences(text):
+        tokens = count(sentence)
+        if tokens > max_tokens:
+            parts = split_oversized(sentence, max_tokens, count)
+        else:
+            parts = [sentence]
+
+        for part in parts:
+            tokens = count(part) if len(parts) > 1 else tokens
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append(''.join(current).strip())
+                current = []
+                current_tokens = 0
+            current.append(part)
+            current_tokens += tokens
+
+    if current:
+        chunks.append(''.join(current).strip())
+    return [chunk for chunk in chunks if chunk]
+
+def plan_batches(token_counts: List[int], max_tokens: int, min_batches: int = 1) -> List[List[int]]:
+    """Group consecutive chunk indices into batches of at most max_tokens tokens.
+
+    The budget shrinks so there are at least min_batches batches when the
+    chunks allow it, keeping some requests running in parallel. A chunk over
+    the budget gets a batch of its own.
+    """
+    budget = min(max_tokens, math.ceil(sum(token_counts) / max(min_batches, 1)))
+    batches = []
+    current = []
+    current_tokens = 0
+    for i, tokens in enumerate(token_counts):
+        if current and current_tokens + tokens > budget:
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
@@ -0,0 +1,70 @@
+import os
+import gzip
+import tempfile
+from flask import request, send_file
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip variants are always written
+    brotli = None
+
+MARKDOWN_MIMETYPE = 'text/markdown; charset=utf-8'
+# Preferred first when the client accepts several
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def precompress_file(file_path: str, min_bytes: int):
+    """Write compressed copies of a file next to it, to be sent as-is on download.
+
+    Variants are only served while they are at least as new as the file, so
+    a failure here never causes stale content to be sent.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            data = f.read()
+
+        for encoding, suffix in ENCODING_SUFFIXES.items():
+            variant_path = file_path + suffix
+            if len(data) < min_bytes or (encoding == 'br' and brotli is None):
+                if os.path.exists(variant_path):
+                    os.remove(variant_path)
+                continue
+
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(compress(data, encoding))
+            os.replace(tmp_path, variant_path)
+    except OSError as e:
+        print(f"Error precompressing {file_path}: {e}")
+
+def send_transcript(file_path: str):
+    """Send a transcript file unchanged, using a precompressed variant the client accepts.
+
+    send_file answers conditional requests (ETag and Last-Modified) with 304
+    and Range requests with 206 from the file on disk.
+    """
+    source_mtime = os.stat(file_path).st_mtime_ns
+    for encoding, suffix in ENCODING_SUFFIXES.items():
+        variant_path = file_path + suffix
+        if not request.accept_encodings[encoding]:
+            continue
+        try:
+            if os.stat(variant_path).st_mtime_ns < source_mtime:
+                continue
+        except FileNotFoundError:
+            continue
+
+        response = send_file(variant_path, mimetype=MARKDOWN_MIMETYPE, conditional=True, etag=True)
+        response.headers['Content-Encoding'] = encoding
+        break
+    else:
+        response = send_file(file_path, mimetype=MARKDOWN_MIMETYPE, conditional=True, etag=True)
+
+    response.vary.add('Accept-Encoding')
+    # Cached copies are revalidated, which costs a 304 once the file is unchanged
+    response.cache_control.no_cache = True
+    return response
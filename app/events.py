@@ -0,0 +1,289 @@
+import re
+import json
+import time
+import asyncio
+import redis
+import redis.asyncio as aioredis
+from typing import List
+from config import Config
+
+EVENTS_PATH = '/events/'
+TEXT_STREAM_VIEW = 'text'
+TERMINAL_EVENTS = ('done', 'error')
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f-]{36}$')
+
+_redis_client = None
+_async_redis_client = None
+_results_client = None
+
+def event_channel(job_id: str) -> str:
+    return f"events:{job_id}"
+
+def event_history_key(job_id: str) -> str:
+    return f"events:{job_id}:history"
+
+def delta_channel(job_id: str) -> str:
+    return f"events:{job_id}:deltas"
+
+def get_events_redis():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.from_url(Config.EVENTS_REDIS_URL)
+    return _redis_client
+
+def get_results_redis():
+    global _results_client
+    if _results_client is None:
+        _results_client = redis.from_url(Config.PARTIAL_RESULTS_REDIS_URL)
+    return _results_client
+
+def get_async_events_redis():
+    global _async_redis_client
+    if _async_redis_client is None:
+        _async_redis_client = aioredis.from_url(Config.EVENTS_REDIS_URL)
+    return _async_redis_client
+
+def publish_event(job_id: str, event_type: str, **data):
+    """Publish a progress event for a job; a failure to publish never fails the job.
+
+    Events are also appended to a short-lived history list, so a client that
+    connects after the job started replays what it missed.
+    """
+    if not job_id:
+        return
+    try:
+        client = get_events_redis()
+        history_key = event_history_key(job_id)
+        event = {'type': event_type, 'job_id': job_id, 'time': time.time(), **data}
+        event['seq'] = client.incr(f"{history_key}:seq")
+        payload = json.dumps(event)
+
+        pipe = client.pipeline()
+        pipe.rpush(history_key, payload)
+        pipe.expire(history_key, Config.EVENTS_TTL)
+        pipe.expire(f"{history_key}:seq", Config.EVENTS_TTL)
+        pipe.publish(event_channel(job_id), payload)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Could not publish {event_type} event for job {job_id}: {e}")
+
+class DeltaRelay:
+    """Publish streamed LLM text of a job's chunks as it arrives.
+
+    Deltas are only published, never stored: a chunk's final text comes with
+    its chunk event. Text is coalesced for STREAM_FLUSH_SECONDS so a fast
+    stream costs a few messages a second rather than one per token.
+    """
+
+    def __init__(self, job_id: str, flush_seconds: float = Config.STREAM_FLUSH_SECONDS):
+        self.job_id = job_id
+        self.flush_seconds = flush_seconds
+        self.pending = {}
+        self.last_flush = time.monotonic()
+
+    def add(self, index: int, text: str):
+        self.pending[index] = self.pending.get(index, '') + text
+        if time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        try:
+            pipe = get_events_redis().pipeline()
+            for index, text in pending.items():
+                pipe.publish(delta_channel(self.job_id), json.dumps({'index': index, 'text': text}))
+            pipe.execute()
+        except redis.RedisError as e:
+            print(f"Could not relay streamed text for job {self.job_id}: {e}")
+
+def partial_results_key(job_id: str) -> str:
+    return f"partial:{job_id}"
+
+def store_chunk_result(job_id: str, chunk_num: int, text: str):
+    """Keep one chunk's text so clients can read the transcript before the job finishes"""
+    if not job_id:
+        return
+    try:
+        key = partial_results_key(job_id)
+        pipe = get_results_redis().pipeline()
+        pipe.hset(key, chunk_num, text.encode('utf-8'))
+        pipe.expire(key, Config.EVENTS_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Could not store chunk {chunk_num} of job {job_id}: {e}")
+
+def load_chunk_results(job_id: str, start: int, limit: int) -> List[str]:
+    """Return the texts of the finished chunks from start on, stopping at the first gap"""
+    values = get_results_redis().hmget(partial_results_key(job_id), list(range(start, start + limit)))
+    texts = []
+    for value in values:
+        if value is None:
+            break
+        texts.append(value.decode('utf-8'))
+    return texts
+
+def format_sse(event: dict) -> bytes:
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n".encode('utf-8')
+
+def format_text_sse(event_type: str, data: dict) -> bytes:
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+
+class EventStreamMiddleware:
+    """ASGI middleware serving /events/<job_id> as a Server-Sent Events stream.
+
+    /events/<job_id>/text streams the text of a translation or formatting
+    job in chunk order instead. Streams are served on the event loop from
+    Redis pub/sub, so an open connection costs a socket rather than one of
+    the threads that run the Flask app. Every other request is passed to
+    the wrapped app.
+    """
+
+    def __init__(self, app, keepalive: float = Config.EVENTS_KEEPALIVE_SECONDS):
+        self.app = app
+        self.keepalive = keepalive
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http' or not scope['path'].startswith(EVENTS_PATH):
+            return await self.app(scope, receive, send)
+
+        job_id, _, view = scope['path'][len(EVENTS_PATH):].partition('/')
+        if not JOB_ID_PATTERN.match(job_id) or view not in ('', TEXT_STREAM_VIEW):
+            await send({'type': 'http.response.start', 'status': 404, 'headers': [(b'content-length', b'0')]})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        relay = self._stream_text if view == TEXT_STREAM_VIEW else self._stream
+        stream = asyncio.ensure_future(relay(job_id, send))
+        disconnect = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        done, pending = await asyncio.wait({stream, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+
+        if stream in done:
+            if stream.exception() is not None:
+                print(f"Event stream for job {job_id} failed: {stream.exception()}")
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def _lifespan(self, receive, send):
+        # The wrapped WSGI app has no lifespan of its own
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def _stream(self, job_id: str, send):
+        """Relay a job's events until it finishes, replaying its history first"""
+        client = get_async_events_redis()
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        # Subscribe before reading the history so no event falls in between
+        await pubsub.subscribe(event_channel(job_id))
+        seen = set()
+        try:
+            history = await client.lrange(event_history_key(job_id), 0, -1)
+            for payload in history:
+                event = json.loads(payload)
+                seen.add(event['seq'])
+                await send({'type': 'http.response.body', 'body': format_sse(event), 'more_body': True})
+                if event['type'] in TERMINAL_EVENTS:
+                    return
+
+            while True:
+                message = await pubsub.get_message(timeout=self.keepalive)
+                if message is None:
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                    continue
+
+                event = json.loads(message['data'])
+                if event['seq'] in seen:
+                    continue
+                seen.add(event['seq'])
+                await send({'type': 'http.response.body', 'body': format_sse(event), 'more_body': True})
+                if event['type'] in TERMINAL_EVENTS:
+                    return
+        finally:
+            await pubsub.aclose()
+
+    async def _stream_text(self, job_id: str, send):
+        """Relay a job's streamed text in chunk order until it finishes.
+
+        Deltas of the earliest unfinished chunk are sent as they arrive, and
+        those of later chunks are held until it finishes. A 'chunk' event
+        carries a finished chunk's final text, which replaces what was
+        streamed for it.
+        """
+        client = get_async_events_redis()
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        events_channel = event_channel(job_id)
+        await pubsub.subscribe(events_channel, delta_channel(job_id))
+        seen = set()
+        finished = {}
+        held = {}
+        cursor = 0
+
+        async def emit(event_type, data):
+            await send({'type': 'http.response.body', 'body': format_text_sse(event_type, data), 'more_body': True})
+
+        async def advance():
+            nonlocal cursor
+            while cursor in finished:
+                await emit('chunk', {'index': cursor, 'text': finished.pop(cursor)})
+                held.pop(cursor, None)
+                cursor += 1
+                if cursor in held:
+                    await emit('delta', {'index': cursor, 'text': held.pop(cursor)})
+
+        async def handle_event(event):
+            seen.add(event['seq'])
+            if event['type'] == 'chunk' and 'text' in event and event['index'] >= cursor:
+                finished[event['index']] = event['text']
+                await advance()
+            elif event['type'] in TERMINAL_EVENTS:
+                await emit(event['type'], {'job_id': job_id})
+                return True
+            return False
+
+        try:
+            for payload in await client.lrange(event_history_key(job_id), 0, -1):
+                if await handle_event(json.loads(payload)):
+                    return
+
+            while True:
+                message = await pubsub.get_message(timeout=self.keepalive)
+                if message is None:
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                    continue
+
+                if message['channel'].decode() == events_channel:
+                    event = json.loads(message['data'])
+                    if event['seq'] not in seen and await handle_event(event):
+                        return
+                    continue
+
+                delta = json.loads(message['data'])
+                if delta['index'] == cursor:
+                    await emit('delta', delta)
+                elif delta['index'] > cursor:
+                    held[delta['index']] = held.get(delta['index'], '') + delta['text']
+        finally:
+            await pubsub.aclose()
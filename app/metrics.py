@@ -0,0 +1,194 @@
+import os
+import time
+import resource
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+import httpx
+import openai
+from flask import request, g
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest
+    from prometheus_client import multiprocess
+except ImportError:  # Metrics are recorded nowhere without prometheus_client
+    prometheus_client = None
+
+# Celery workers and the web app share counters by writing them to this
+# directory, which prometheus_client reads at import time
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+PUBLISHED_AT_HEADER = 'published_at'
+
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+QUEUE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+RSS_BUCKETS = tuple(2 ** n * 1024 * 1024 for n in range(5, 15))  # 32MB to 16GB
+RETRIED_STATUSES = (408, 409, 429)  # Besides 5xx, as in the OpenAI client
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+def _counter(name: str, documentation: str, labelnames=()):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return Counter(name, documentation, labelnames)
+
+def _histogram(name: str, documentation: str, labelnames, buckets):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return Histogram(name, documentation, labelnames, buckets=buckets)
+
+STAGE_SECONDS = _histogram('transcriber_stage_seconds', 'Time spent in each pipeline stage',
+                           ['stage'], STAGE_BUCKETS)
+AUDIO_INPUT_BYTES = _counter('transcriber_audio_input_bytes', 'Bytes of audio split for transcription')
+AUDIO_UPLOADED_BYTES = _counter('transcriber_audio_uploaded_bytes', 'Bytes of audio chunks uploaded to Whisper')
+AUDIO_SECONDS = _counter('transcriber_audio_seconds', 'Seconds of audio transcribed')
+CHUNKS = _counter('transcriber_chunks', 'Chunks handled, by kind and whether they came from cache',
+                  ['kind', 'cached'])
+LLM_TOKENS = _counter('transcriber_llm_tokens', 'Chat completion tokens, by model and direction',
+                      ['model', 'direction'])
+API_RESPONSES = _counter('transcriber_api_responses', 'HTTP responses from the OpenAI API, by endpoint and status',
+                         ['endpoint', 'status'])
+API_RETRIES = _counter('transcriber_api_retries', 'OpenAI API responses the client retries, by endpoint',
+                       ['endpoint'])
+QUEUE_WAIT_SECONDS = _histogram('transcriber_task_queue_wait_seconds',
+                                'Time from publishing a Celery task to a worker starting it',
+                                ['task'], QUEUE_BUCKETS)
+TASK_PEAK_RSS_BYTES = _histogram('transcriber_task_peak_rss_bytes',
+                                 'Peak resident memory of the worker process while running a task',
+                                 ['task'], RSS_BUCKETS)
+HTTP_REQUEST_SECONDS = _histogram('transcriber_http_request_seconds', 'Latency of requests to the web app',
+                                  ['endpoint', 'method', 'status'], STAGE_BUCKETS)
+
+@contextmanager
+def time_stage(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+def timed_iter(items: Iterable, stage: str) -> Iterator:
+    """Yield from items, timing how long each one takes to produce"""
+    iterator = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+        yield item
+
+def record_llm_tokens(model: str, prompt_tokens: int, completion_tokens: int):
+    LLM_TOKENS.labels(model, 'prompt').inc(prompt_tokens)
+    LLM_TOKENS.labels(model, 'completion').inc(completion_tokens)
+
+def _is_retried(response: httpx.Response) -> bool:
+    """Whether the OpenAI client retries after this response, by the same rules it uses.
+
+    When its retries have run out the last response is counted as well.
+    """
+    should_retry = response.headers.get('x-should-retry')
+    if should_retry in ('true', 'false'):
+        return should_retry == 'true'
+    return response.status_code in RETRIED_STATUSES or response.status_code >= 500
+
+def _record_api_response(response: httpx.Response):
+    endpoint = response.request.url.path
+    API_RESPONSES.labels(endpoint, str(response.status_code)).inc()
+    if _is_retried(response):
+        API_RETRIES.labels(endpoint).inc()
+
+async def _record_api_response_async(response: httpx.Response):
+    _record_api_response(response)
+
+def openai_http_client(**options) -> httpx.Client:
+    """HTTP client for OpenAI() that counts every response, including retried ones.
+
+    Options such as limits and http2 are passed on to httpx.
+    """
+    return httpx.Client(timeout=openai.DEFAULT_TIMEOUT, follow_redirects=True,
+                        event_hooks={'response': [_record_api_response]}, **options)
+
+def openai_async_http_client(**options) -> httpx.AsyncClient:
+    return httpx.AsyncClient(timeout=openai.DEFAULT_TIMEOUT, follow_redirects=True,
+                             event_hooks={'response': [_record_api_response_async]}, **options)
+
+def peak_rss_bytes() -> int:
+    """Peak resident memory of this process, since the last reset_peak_rss where supported"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+def reset_peak_rss():
+    # Linux resets VmHWM to the current RSS when 5 is written here
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def connect_celery_signals():
+    """Record queue wait and peak memory of every Celery task"""
+    from celery.signals import before_task_publish, task_prerun, task_postrun, worker_process_shutdown
+
+    @before_task_publish.connect(weak=False)
+    def stamp_publish_time(headers=None, **kwargs):
+        if headers is not None:
+            headers[PUBLISHED_AT_HEADER] = time.time()
+
+    @task_prerun.connect(weak=False)
+    def record_queue_wait(task=None, **kwargs):
+        published_at = task.request.get(PUBLISHED_AT_HEADER)
+        if published_at:
+            QUEUE_WAIT_SECONDS.labels(task.name).observe(max(0.0, time.time() - published_at))
+        reset_peak_rss()
+
+    @task_postrun.connect(weak=False)
+    def record_peak_rss(task=None, **kwargs):
+        TASK_PEAK_RSS_BYTES.labels(task.name).observe(peak_rss_bytes())
+
+    @worker_process_shutdown.connect(weak=False)
+    def forget_worker_process(**kwargs):
+        if prometheus_client is not None and MULTIPROC_DIR:
+            multiprocess.mark_process_dead(os.getpid())
+
+def init_app(app):
+    """Time every request to the web app"""
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_REQUEST_SECONDS.labels(endpoint, request.method, str(response.status_code)).observe(
+                time.perf_counter() - started
+            )
+        return response
+
+def render_metrics() -> tuple:
+    """Body and content type of the Prometheus text exposition of all processes"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,60 @@
+import time
+import asyncio
+import threading
+
+class TokenBucket:
+    """Token bucket that refills continuously up to a per-minute budget.
+
+    State is guarded by a thread lock rather than an asyncio lock, so a single
+    bucket can be shared by every event loop and thread in the process.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0  # units per second
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount: float) -> float:
+        """Take amount from the bucket, or return the seconds to wait before retrying"""
+        # A single request larger than the whole budget can never fit, let it
+        # through once the bucket is full instead of blocking forever
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self.available >= amount:
+                self.available -= amount
+                return 0.0
+            return (amount - self.available) / self.rate
+
+    def adjust(self, amount: float):
+        """Give back (positive) or charge (negative) units once the real cost is known"""
+        with self._lock:
+            self._refill()
+            self.available = min(self.capacity, self.available + amount)
+
+class RateLimiter:
+    """Combined requests-per-minute and tokens-per-minute limiter for API calls"""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    async def acquire(self, tokens: int):
+        """Wait until both budgets allow a request costing the estimated tokens"""
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            while True:
+                wait = bucket.try_acquire(amount)
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the token budget with the usage reported by the API"""
+        self.tokens.adjust(estimated_tokens - actual_tokens)
@@ -1,46 +1,47 @@
 from flask import Blueprint, render_template, request, jsonify, current_app, session
 from werkzeug.utils import secure_filename
 import os
-from openai import OpenAI
-import tempfile
-from moviepy.editor import VideoFileClip
 from datetime import datetime
-from pydub import AudioSegment
-import math
-from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.exceptions import RequestEntityTooLarge, HTTPException
 import uuid
+import time
 from app.tasks import (
     process_transcription, 
-    translate_chunk_task, 
+    dispatch_transcription,
+    translate_batch_task, 
     combine_translations, 
-    process_chunk_task, 
+    process_batch_task, 
     combine_processed_chunks, 
     save_processed_text,
     save_translation_task
 )
-from app.utils import process_large_audio, transcribe_audio_file, save_transcript, cleanup_user_files, process_text_with_gpt4, translate_text_concurrently, split_into_sentence_chunks
+from app.utils import process_large_audio, transcribe_audio_file, save_transcript, cleanup_user_files, process_text_with_gpt4, translate_text_concurrently
+from app.chunking import chunk_text, count_tokens, plan_batches
 import asyncio
 from celery import group
 from app.celery_app import celery
+from app.cache import get_transcript_cache, get_llm_cache
+from app.uploads import (
+    create_upload, get_upload_dir, load_manifest, write_part, received_parts, complete_upload,
+    list_uploads, expire_uploads
+)
+from app.events import publish_event, load_chunk_results
+from app.catalog import get_catalog, SORT_COLUMNS
+from app.downloads import send_transcript
+from app.metrics import render_metrics, prometheus_client
+from app.tracing import set_attributes
+from app.transcripts import load_meta, load_segments, record_dir, markdown_file, render_srt, render_vtt, SEGMENTS_NAME
+import hashlib
 
 main = Blueprint('main', __name__)
 
 ALLOWED_EXTENSIONS = {'mp4', 'mp3', 'wav', 'webm', 'mpga', 'm4a'}
-MAX_CHUNK_SIZE = 10 * 1024 * 1024  # 24MB to be safe
-CHUNK_DURATION = 10 * 60 * 1000  # 10 minutes in milliseconds
 
 def ensure_directories():
     """Ensure all required directories exist"""
     os.makedirs(current_app.config['TEMP_DIR'], exist_ok=True)
     os.makedirs(current_app.config['TRANSCRIPTS_DIR'], exist_ok=True)
 
-def get_openai_client():
-    """Create and return an OpenAI client instance"""
-    api_key = current_app.config['OPENAI_API_KEY']
-    if not api_key:
-        raise ValueError("OpenAI API key not found in configuration")
-    return OpenAI(api_key=api_key)
-
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -71,85 +72,6 @@ Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
     
     return file_path
 
-def convert_video_to_audio(video_path):
-    """Convert video file to audio file"""
-    try:
-        # Create a temporary file for the audio in our temp directory
-        audio_path = os.path.join(
-            current_app.config['TEMP_DIR'],
-            next(tempfile._get_candidate_names()) + '.mp3'
-        )
-        
-        # Load the video file
-        video = VideoFileClip(video_path)
-        # Extract the audio
-        video.audio.write_audiofile(audio_path, codec='mp3')
-        # Close the video to release resources
-        video.close()
-        
-        return audio_path
-    except Exception as e:
-        if os.path.exists(audio_path):
-            os.unlink(audio_path)
-        raise Exception(f"Error converting video to audio: {str(e)}")
-
-def process_large_audio(audio_path, user_session):
-    """Process large audio files by splitting them into chunks"""
-    try:
-        print(f"Starting to process audio file: {audio_path}")
-        # Load the audio file
-        audio = AudioSegment.from_file(audio_path)
-        print(f"Successfully loaded audio file, duration: {len(audio)}ms")
-        
-        # Get file size
-        file_size = os.path.getsize(audio_path)
-        print(f"File size: {file_size / (1024*1024):.2f}MB")
-        
-        if file_size <= MAX_CHUNK_SIZE:
-            print("File is small enough, no need to split")
-            return [audio_path]
-        
-        # Calculate number of chunks needed
-        total_duration = len(audio)
-        num_chunks = math.ceil(total_duration / CHUNK_DURATION)
-        print(f"Need to split into {num_chunks} chunks")
-        
-        chunk_paths = []
-        
-        user_temp_dir = os.path.join(current_app.config['TEMP_DIR'], user_session)
-        
-        for i in range(num_chunks):
-            start_time = i * CHUNK_DURATION
-            end_time = min((i + 1) * CHUNK_DURATION, total_duration)
-            print(f"Processing chunk {i+1}/{num_chunks} ({start_time}ms to {end_time}ms)")
-            
-            # Extract chunk
-            chunk = audio[start_time:end_time]
-            
-            # Create temporary file for chunk
-            chunk_path = os.path.join(
-                user_temp_dir,
-                f"chunk_{i}_{next(tempfile._get_candidate_names())}.mp3"
-            )
-            print(f"Saving chunk to: {chunk_path}")
-            
-            # Export chunk with compression
-            chunk.export(
-                chunk_path,
-                format="mp3",
-                parameters=["-q:a", "1"]  # High quality compression
-            )
-            print(f"Successfully exported chunk {i+1}")
-            
-            chunk_paths.append(chunk_path)
-        
-        print(f"Successfully created {len(chunk_paths)} chunks")
-        return chunk_paths
-    
-    except Exception as e:
-        print(f"Error in process_large_audio: {str(e)}")
-        raise Exception(f"Error processing large audio file: {str(e)}")
-
 def transcribe_audio_file(client, audio_path):
     """Transcribe a single audio file and post-process with GPT-4"""
     try:
@@ -173,34 +95,45 @@ def transcribe_audio_file(client, audio_path):
         print(f"Error in transcribe_audio_file: {str(e)}")
         raise
 
-def cleanup_user_files(user_session):
-    """Clean up all temporary files for a user session"""
-    user_temp_dir = os.path.join(current_app.config['TEMP_DIR'], user_session)
-    try:
-        if os.path.exists(user_temp_dir):
-            for filename in os.listdir(user_temp_dir):
-                file_path = os.path.join(user_temp_dir, filename)
-                try:
-                    os.unlink(file_path)
-                except Exception as e:
-                    print(f"Error deleting file {file_path}: {e}")
-            os.rmdir(user_temp_dir)
-    except Exception as e:
-        print(f"Error cleaning up user directory: {e}")
+def conditional_response(etag: str, build_response):
+    """Answer 304 if the client already holds this ETag, otherwise build the response"""
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = build_response()
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
 
 @main.route('/', methods=['GET'])
 def index():
     return render_template('index.html')
 
+def get_user_temp_dir():
+    """Return the current session's temp directory, creating the session if needed"""
+    if 'user_session' not in session:
+        session['user_session'] = str(uuid.uuid4())
+    
+    user_temp_dir = os.path.join(current_app.config['TEMP_DIR'], session['user_session'])
+    os.makedirs(user_temp_dir, exist_ok=True)
+    return user_temp_dir
+
+def start_transcription(temp_path, user_session, filename):
+    """Queue the transcription task for an uploaded file.
+
+    Audio extraction from videos happens in the task, so this returns as soon
+    as the upload is stored.
+    """
+    if current_app.config['TRANSCRIPTION_FANOUT']:
+        return dispatch_transcription.delay(temp_path, user_session, filename)
+    return process_transcription.delay(temp_path, user_session, filename)
+
 @main.route('/transcribe', methods=['POST'])
 def transcribe():
+    temp_path = None
     try:
-        if 'user_session' not in session:
-            session['user_session'] = str(uuid.uuid4())
-        
+        user_temp_dir = get_user_temp_dir()
         user_session = session['user_session']
-        user_temp_dir = os.path.join(current_app.config['TEMP_DIR'], user_session)
-        os.makedirs(user_temp_dir, exist_ok=True)
         
         ensure_directories()
         print("Starting transcription process")
@@ -227,19 +160,10 @@ def transcribe():
         print(f"Upload file size: {file_size / (1024*1024):.2f}MB")
 
         # Save file to user's temp directory
-        temp_path = os.path.join(user_temp_dir, secure_filename(file.filename))
+        temp_path = os.path.join(user_temp_dir, f"{uuid.uuid4().hex}_{secure_filename(file.filename)}")
         file.save(temp_path)
         
-        # Convert video to audio if needed
-        if file.filename.lower().endswith(('.mp4', '.webm')):
-            print("Converting video to audio")
-            audio_path = convert_video_to_audio(temp_path)
-            os.unlink(temp_path)
-            temp_path = audio_path
-            print(f"Video converted to audio: {audio_path}")
-
-        # Start background task
-        task = process_transcription.delay(temp_path, user_session, file.filename)
+        task = start_transcription(temp_path, user_session, file.filename)
         
         return jsonify({
             'task_id': task.id,
@@ -248,48 +172,219 @@ def transcribe():
         
     except Exception as e:
         print(f"Error in transcribe route: {str(e)}")
-        cleanup_user_files(session.get('user_session'))
+        cleanup_user_files(session.get('user_session'), temp_path)
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/uploads', methods=['POST'])
+def init_upload():
+    """Start a resumable upload; parts are then PUT individually and completed"""
+    try:
+        filename = request.json.get('filename')
+        size = request.json.get('size')
+        if not filename or not isinstance(size, int) or size <= 0:
+            return jsonify({'error': 'Missing filename or size'}), 400
+        
+        if not allowed_file(filename):
+            return jsonify({'error': 'File type not allowed'}), 400
+        
+        if size > current_app.config['MAX_UPLOAD_SIZE']:
+            return jsonify({'error': 'File too large'}), 413
+        
+        expired = expire_uploads(current_app.config['TEMP_DIR'], current_app.config['UPLOAD_EXPIRY_SECONDS'])
+        if expired:
+            print(f"Removed {expired} abandoned uploads")
+        
+        user_temp_dir = get_user_temp_dir()
+        if len(list_uploads(user_temp_dir)) >= current_app.config['MAX_OPEN_UPLOADS']:
+            return jsonify({'error': 'Too many uploads in progress, complete or wait for one first'}), 429
+        
+        manifest = create_upload(user_temp_dir, filename, size, current_app.config['UPLOAD_PART_SIZE'])
+        print(f"Started upload {manifest['upload_id']} for {filename} ({manifest['parts']} parts)")
+        return jsonify(manifest)
+        
+    except Exception as e:
+        print(f"Error starting upload: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload_status(upload_id):
+    """Report which parts have been received so a client can resume"""
+    try:
+        upload_dir = get_upload_dir(get_user_temp_dir(), upload_id)
+        manifest = load_manifest(upload_dir)
+        return jsonify({**manifest, 'received': received_parts(upload_dir)})
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/uploads/<upload_id>/parts/<int:part_number>', methods=['PUT'])
+def put_upload_part(upload_id, part_number):
+    """Write one part of an upload, verifying its length and optional SHA-256"""
+    try:
+        upload_dir = get_upload_dir(get_user_temp_dir(), upload_id)
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({'error': str(e)}), 404
+    
+    try:
+        manifest = load_manifest(upload_dir)
+        digest = write_part(
+            upload_dir,
+            manifest,
+            part_number,
+            request.stream,
+            request.headers.get('X-Content-SHA256')
+        )
+        return jsonify({'part': part_number, 'sha256': digest})
+    except ValueError as e:
+        print(f"Rejected part {part_number} of upload {upload_id}: {e}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error writing part {part_number} of upload {upload_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload_route(upload_id):
+    """Assemble a finished upload and start its transcription"""
+    try:
+        user_temp_dir = get_user_temp_dir()
+        upload_dir = get_upload_dir(user_temp_dir, upload_id)
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({'error': str(e)}), 404
+    
+    try:
+        manifest = load_manifest(upload_dir)
+        temp_path = complete_upload(upload_dir, manifest, user_temp_dir)
+        print(f"Completed upload {upload_id}: {temp_path}")
+        
+        task = start_transcription(temp_path, session['user_session'], manifest['filename'])
+        return jsonify({
+            'task_id': task.id,
+            'status': 'processing'
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        print(f"Error completing upload {upload_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
 @main.route('/transcripts', methods=['GET'])
 def get_transcripts():
-    """Get list of all transcription files"""
+    """List transcripts from the catalog, one page at a time.
+
+    Accepts ?page=, ?per_page=, ?sort= (created_at, original_name, duration
+    or size) and ?order= (asc or desc, newest first by default). The total
+    number of transcripts is returned in the X-Total-Count header.
+    """
     try:
-        transcripts = []
-        for filename in os.listdir(current_app.config['TRANSCRIPTS_DIR']):
-            if filename.endswith('.md'):
-                file_path = os.path.join(current_app.config['TRANSCRIPTS_DIR'], filename)
-                # Get file creation time
-                creation_time = os.path.getctime(file_path)
-                creation_date = datetime.fromtimestamp(creation_time).strftime('%Y-%m-%d %H:%M:%S')
-                
-                # Get original filename (remove timestamp and .md)
-                original_name = filename.rsplit('_', 1)[0]
-                
-                transcripts.append({
-                    'filename': filename,
-                    'original_name': original_name,
-                    'created_at': creation_date
-                })
-        
-        # Sort by creation time, newest first
-        transcripts.sort(key=lambda x: x['created_at'], reverse=True)
-        return jsonify(transcripts)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = request.args.get('per_page', current_app.config['TRANSCRIPTS_PAGE_SIZE'], type=int)
+        per_page = min(max(per_page, 1), current_app.config['TRANSCRIPTS_MAX_PAGE_SIZE'])
+        sort = request.args.get('sort', 'created_at')
+        order = request.args.get('order', 'desc')
+        if sort not in SORT_COLUMNS or order not in ('asc', 'desc'):
+            return jsonify({'error': f"sort must be one of {', '.join(SORT_COLUMNS)} and order asc or desc"}), 400
+        
+        catalog = get_catalog()
+        etag = hashlib.sha256(f"{catalog.version()}:{page}:{per_page}:{sort}:{order}".encode('utf-8')).hexdigest()
+        
+        def build_response():
+            transcripts, total = catalog.list(page, per_page, sort, descending=order == 'desc')
+            response = jsonify(transcripts)
+            response.headers['X-Total-Count'] = str(total)
+            return response
+        
+        return conditional_response(etag, build_response)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/search', methods=['GET'])
+def search_transcripts():
+    """Full-text search over transcript names and their English and Chinese text.
+
+    Every term in ?q= must match; results are ranked best first and carry a
+    snippet with the matches wrapped in <mark>. Paginate with ?page=.
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Missing query'}), 400
+        
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = current_app.config['SEARCH_PAGE_SIZE']
+        started = time.perf_counter()
+        results = get_catalog().search(query, per_page, (page - 1) * per_page)
+        return jsonify({
+            'query': query,
+            'results': results,
+            'took_ms': round((time.perf_counter() - started) * 1000, 2)
+        })
     except Exception as e:
+        print(f"Search error: {e}")
         return jsonify({'error': str(e)}), 500
 
 @main.route('/transcripts/<filename>', methods=['GET'])
 def get_transcript(filename):
     """Get content of a specific transcript"""
     try:
-        file_path = os.path.join(current_app.config['TRANSCRIPTS_DIR'], filename)
-        if not os.path.exists(file_path):
+        file_path = markdown_file(filename)
+        if file_path is None:
             return jsonify({'error': 'Transcript not found'}), 404
-            
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        return jsonify({'content': content})
+        
+        # The file is only read when the client's copy is out of date
+        stat = os.stat(file_path)
+        etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        
+        def build_response():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            return jsonify({'content': content})
+        
+        return conditional_response(etag, build_response)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/transcripts/<filename>/raw', methods=['GET'])
+def download_transcript(filename):
+    """Send the transcript's markdown as-is, with conditional, Range and precompressed responses"""
+    try:
+        file_path = markdown_file(filename)
+        if file_path is None:
+            return jsonify({'error': 'Transcript not found'}), 404
+        return send_transcript(file_path)
+    except HTTPException as e:
+        # Unsatisfiable ranges
+        return e
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+SUBTITLE_RENDERERS = {
+    'srt': (render_srt, 'application/x-subrip; charset=utf-8'),
+    'vtt': (render_vtt, 'text/vtt; charset=utf-8'),
+}
+
+@main.route('/transcripts/<filename>/subtitles.<any(srt, vtt):fmt>', methods=['GET'])
+def download_subtitles(filename, fmt):
+    """Render the transcript's timed segments as SRT or WebVTT"""
+    try:
+        if filename != secure_filename(filename) or load_meta(filename) is None:
+            return jsonify({'error': 'Transcript not found'}), 404
+        
+        segments_path = os.path.join(record_dir(filename), SEGMENTS_NAME)
+        stat = os.stat(segments_path)
+        if stat.st_size <= len('[]'):
+            return jsonify({'error': 'This transcript has no timestamps'}), 404
+        etag = f"{fmt}-{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        
+        def build_response():
+            segments = load_segments(filename)
+            render, mimetype = SUBTITLE_RENDERERS[fmt]
+            response = current_app.response_class(render(segments), mimetype=mimetype)
+            download_name = f"{os.path.splitext(filename)[0]}.{fmt}"
+            response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+            return response
+        
+        return conditional_response(etag, build_response)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -310,30 +405,50 @@ def get_task_status(task_id):
         print(f"Error checking task status: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@celery.task
-def save_translation_task(translation: str, filename: str):
-    """Save translation and return the translated text"""
+@main.route('/task/<task_id>/chunks', methods=['GET'])
+def get_task_chunks(task_id):
+    """Transcribed chunks of a running task, in order from ?start=.
+
+    Only the contiguous run of finished chunks is returned, so a client can
+    append them and ask again from `next`. Seams between overlapping chunks
+    are not de-duplicated until the final transcript.
+    """
     try:
-        # Read existing file
-        file_path = os.path.join(current_app.config['TRANSCRIPTS_DIR'], filename)
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Get English content
-        english_content = content.split('## Chinese Content')[0].strip()
-        
-        # Create new content with both versions
-        new_content = f"{english_content}\n\n## Chinese Content / 中文内容\n\n{translation}"
-        
-        # Save updated content
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-            
-        # Return the translation for the frontend
-        return translation
+        start = max(request.args.get('start', 0, type=int), 0)
+        limit = min(
+            request.args.get('limit', current_app.config['PARTIAL_RESULTS_PAGE_SIZE'], type=int),
+            current_app.config['PARTIAL_RESULTS_PAGE_SIZE']
+        )
+        texts = load_chunk_results(task_id, start, max(limit, 1))
+        return jsonify({
+            'chunks': [{'index': start + i, 'text': text} for i, text in enumerate(texts)],
+            'next': start + len(texts)
+        })
     except Exception as e:
-        print(f"Error saving translation: {e}")
-        return translation  # Still return translation even if save fails
+        print(f"Error reading chunks of task {task_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics of the web app and, with a shared multiprocess directory, the workers"""
+    try:
+        if prometheus_client is None:
+            return jsonify({'error': 'prometheus_client is not installed'}), 501
+        body, content_type = render_metrics()
+        return current_app.response_class(body, content_type=content_type)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Hit/miss counters and sizes of the result caches"""
+    try:
+        return jsonify({
+            'transcripts': get_transcript_cache().stats(),
+            'llm': get_llm_cache().stats()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @main.route('/translate', methods=['POST'])
 def translate():
@@ -343,18 +458,34 @@ def translate():
         if not text or not filename:
             return jsonify({'error': 'Missing text or filename'}), 400
         
-        # Split text into chunks
-        chunks = split_into_sentence_chunks(text)
-        print(f"Split text into {len(chunks)} chunks for translation")
+        # Pack whole sentences into chunks close to the token budget
+        chunks = chunk_text(text, current_app.config['TRANSLATION_CHUNK_TOKENS'])
+        # Several chunks share each request, leaving enough batches to run in parallel
+        batches = plan_batches(
+            [count_tokens(chunk) for chunk in chunks],
+            current_app.config['TRANSLATION_BATCH_TOKENS'],
+            current_app.config['LLM_BATCH_MIN_PARALLEL']
+        )
+        print(f"Split text into {len(chunks)} chunks in {len(batches)} batches for translation")
+        
+        # The job id names both the event stream and the final task's result
+        job_id = str(uuid.uuid4())
+        publish_event(job_id, 'stage', stage='translating', chunks=len(chunks), batches=len(batches))
+        set_attributes({'transcriber.job_id': job_id, 'transcriber.chunks': len(chunks),
+                        'transcriber.batches': len(batches)})
         
         # Create a group of tasks for parallel processing
         translation_tasks = group(
-            translate_chunk_task.s(chunk, i)
-            for i, chunk in enumerate(chunks)
+            translate_batch_task.s([(i, chunks[i]) for i in batch], job_id)
+            for batch in batches
         )
         
         # Execute tasks, combine results, and save
-        result = (translation_tasks | combine_translations.s() | save_translation_task.s(filename))()
+        result = (
+            translation_tasks
+            | combine_translations.s()
+            | save_translation_task.s(filename, job_id).set(task_id=job_id)
+        )()
         
         return jsonify({
             'task_id': result.id,
@@ -395,18 +526,32 @@ def process_text():
         if not text or not filename:
             return jsonify({'error': 'Missing text or filename'}), 400
         
-        # Split text into chunks
-        chunks = split_into_sentence_chunks(text, max_chunk_size=500)  # Smaller chunks for better processing
-        print(f"Split text into {len(chunks)} chunks for processing")
+        # Pack whole sentences into chunks close to the token budget
+        chunks = chunk_text(text, current_app.config['FORMAT_CHUNK_TOKENS'])
+        batches = plan_batches(
+            [count_tokens(chunk) for chunk in chunks],
+            current_app.config['FORMAT_BATCH_TOKENS'],
+            current_app.config['LLM_BATCH_MIN_PARALLEL']
+        )
+        print(f"Split text into {len(chunks)} chunks in {len(batches)} batches for processing")
+        
+        job_id = str(uuid.uuid4())
+        publish_event(job_id, 'stage', stage='processing', chunks=len(chunks), batches=len(batches))
+        set_attributes({'transcriber.job_id': job_id, 'transcriber.chunks': len(chunks),
+                        'transcriber.batches': len(batches)})
         
         # Create a group of tasks for parallel processing
         processing_tasks = group(
-            process_chunk_task.s(chunk, i)
-            for i, chunk in enumerate(chunks)
+            process_batch_task.s([(i, chunks[i]) for i in batch], job_id)
+            for batch in batches
         )
         
         # Execute tasks, combine results, and save
-        result = (processing_tasks | combine_processed_chunks.s() | save_processed_text.s(filename))()
+        result = (
+            processing_tasks
+            | combine_processed_chunks.s()
+            | save_processed_text.s(filename, job_id).set(task_id=job_id)
+        )()
         
         return jsonify({
             'task_id': result.id,
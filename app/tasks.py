@@ -1,240 +1,615 @@
 import os
-import asyncio
-from typing import List
+import re
+import json
+import shutil
+import contextvars
+from typing import Callable, Iterable, List
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
 from app.celery_app import celery
+from app.cache import TranscriptCache, get_transcript_cache, hash_file, get_llm_cache, llm_cache_key
+from app.events import publish_event, store_chunk_result, DeltaRelay
+from app.transcripts import update_layer
+from app.chunking import count_tokens
+from app.metrics import time_stage, record_llm_tokens, AUDIO_UPLOADED_BYTES, AUDIO_SECONDS, CHUNKS
+from app.tracing import span, set_attributes
 from app.utils import (
     get_openai_client,
+    prepare_audio,
+    plan_audio_chunks,
+    join_transcriptions,
+    merge_segments,
     process_large_audio,
     transcribe_audio_file,
     save_transcript,
     cleanup_user_files,
     process_text_with_gpt4
 )
-from celery import group
-from datetime import datetime
+from celery import group, chord
+from celery.exceptions import Ignore
 
-async def transcribe_chunk_async(client, chunk_path: str, chunk_num: int) -> tuple[int, str]:
-    """Transcribe a single audio chunk asynchronously"""
+WHISPER_MODEL = "whisper-1"
+WHISPER_RESPONSE_FORMAT = "verbose_json"  # Includes timed segments
+LLM_MODEL = "gpt-4o"
+LLM_TEMPERATURE = 0.3
+
+TRANSLATION_SYSTEM_PROMPT = """You are a professional translator. 
+Translate English to Chinese while:
+1. Maintaining the original meaning accurately
+2. Using natural and fluent Chinese expressions
+3. Preserving any markdown formatting
+4. Keeping section headings in both English and Chinese"""
+TRANSLATION_USER_PROMPT = "Translate to Chinese:\n\n{chunk}"
+
+FORMAT_SYSTEM_PROMPT = """You are a transcript editor. Your task is to:
+1. Format the text into proper paragraphs
+2. Add appropriate punctuation where needed
+3. Fix obvious transcription errors
+4. Keep the original meaning and all content intact
+5. Do not add any commentary or additional content
+6. Do not add section headings or markdown formatting
+Just focus on making the text more readable with proper paragraphing."""
+FORMAT_USER_PROMPT = "Format this transcript chunk into proper paragraphs:\n\n{chunk}"
+
+# Appended to the system prompt when several chunks share one request
+BATCH_INSTRUCTIONS = """
+
+The text is split into segments, each introduced by a line such as <<<SEGMENT 1>>>.
+Handle every segment on its own. Reply with each result introduced by the marker
+line of its segment, in the same order, and nothing before the first marker."""
+BATCH_MARKER = "<<<SEGMENT {}>>>"
+BATCH_MARKER_PATTERN = re.compile(r'^[ \t]*<<<SEGMENT (\d+)>>>[ \t]*$', re.MULTILINE)
+
+def transcription_cache_key(file_path: str) -> str:
+    """Cache key covering the uploaded bytes, the chunking parameters and the model"""
+    return TranscriptCache.make_key(
+        hash_file(file_path),
+        model=WHISPER_MODEL,
+        response_format=WHISPER_RESPONSE_FORMAT,
+        max_upload_bytes=current_app.config['WHISPER_MAX_UPLOAD_BYTES'],
+        target_bit_rate=current_app.config['AUDIO_TARGET_BIT_RATE'],
+        max_chunk_seconds=current_app.config['AUDIO_MAX_CHUNK_SECONDS'],
+        overlap_seconds=current_app.config['AUDIO_CHUNK_OVERLAP_SECONDS'],
+        align_to_silence=current_app.config['AUDIO_ALIGN_TO_SILENCE'],
+        silence_search_seconds=current_app.config['AUDIO_SILENCE_SEARCH_SECONDS']
+    )
+
+def parse_transcription(response, start: float) -> dict:
+    """Text and timed segments of a verbose_json response, with times shifted by the chunk start"""
+    data = response.model_dump()
+    return {
+        'start': start,
+        'text': data['text'],
+        'segments': [
+            {
+                'start': round(start + segment['start'], 3),
+                'end': round(start + segment['end'], 3),
+                'text': segment['text'].strip()
+            }
+            for segment in data.get('segments') or []
+        ]
+    }
+
+def transcribe_chunk(client, chunk_path: str, chunk_num: int, cache=None, cache_key=None,
+                     job_id: str = None, start: float = 0.0) -> tuple[int, dict]:
+    """Transcribe a single audio chunk, reusing a cached result when one exists"""
     try:
+        if cache_key:
+            cached = cache.get_chunk(cache_key, chunk_num)
+            if cached is not None:
+                print(f"Chunk {chunk_num} served from cache")
+                result = json.loads(cached)
+                CHUNKS.labels('audio', 'true').inc()
+                store_chunk_result(job_id, chunk_num, result['text'])
+                publish_event(job_id, 'chunk', index=chunk_num, cached=True)
+                return chunk_num, result
+        
         print(f"Transcribing chunk {chunk_num}: {chunk_path}")
-        with open(chunk_path, 'rb') as audio_file:
-            transcription = client.audio.transcriptions.create(
-                model="whisper-1",
+        size = os.path.getsize(chunk_path)
+        AUDIO_UPLOADED_BYTES.inc(size)
+        with time_stage('whisper'), \
+                span('openai.transcription', {'gen_ai.request.model': WHISPER_MODEL,
+                                              'transcriber.chunk': chunk_num, 'file.size': size}), \
+                open(chunk_path, 'rb') as audio_file:
+            response = client.audio.transcriptions.create(
+                model=WHISPER_MODEL,
                 file=audio_file,
-                response_format="text"
+                response_format=WHISPER_RESPONSE_FORMAT
             )
-        return chunk_num, transcription
+        result = parse_transcription(response, start)
+        CHUNKS.labels('audio', 'false').inc()
+        
+        if cache_key:
+            cache.put_chunk(cache_key, chunk_num, json.dumps(result))
+        store_chunk_result(job_id, chunk_num, result['text'])
+        publish_event(job_id, 'chunk', index=chunk_num, cached=False)
+        return chunk_num, result
     except Exception as e:
         print(f"Error transcribing chunk {chunk_num}: {e}")
         raise
 
-async def transcribe_chunks_concurrently(client, chunk_paths: List[str]) -> List[str]:
-    """Transcribe multiple chunks concurrently"""
-    tasks = []
-    for i, chunk_path in enumerate(chunk_paths):
-        task = transcribe_chunk_async(client, chunk_path, i)
-        tasks.append(task)
-    
-    # Wait for all chunks to be transcribed
-    results = await asyncio.gather(*tasks)
+def transcribe_chunks_concurrently(client, chunks: Iterable[tuple[str, float]], max_workers: int,
+                                   cache=None, cache_key=None, job_id: str = None) -> List[dict]:
+    """Transcribe (path, start) chunks on a bounded thread pool, in order.
+
+    Each chunk is submitted as soon as it is yielded, so uploads to Whisper
+    overlap with ffmpeg still cutting the remaining chunks.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        # Each chunk runs in a copy of this context, so its spans belong to the task's trace
+        futures = [
+            executor.submit(contextvars.copy_context().run,
+                            transcribe_chunk, client, chunk_path, i, cache, cache_key, job_id, start)
+            for i, (chunk_path, start) in enumerate(chunks)
+        ]
+        # Futures are kept in submission order, so results come back in chunk order
+        return [future.result()[1] for future in futures]
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def combine_chunk_results(chunks: List[dict]) -> dict:
+    """Join ordered chunk results into the text and segments of the whole recording"""
+    return {
+        'text': join_transcriptions([chunk['text'] for chunk in chunks]),
+        'segments': merge_segments(chunks)
+    }
+
+def save_transcription_result(filename: str, transcription: dict, duration: float = None) -> dict:
+    """Save a finished transcript and build the task result returned to the client"""
+    full_transcription = transcription['text']
+    with time_stage('save'):
+        transcript_path = save_transcript(
+            filename,
+            full_transcription,
+            duration=duration,
+            segments=transcription['segments']
+        )
+    if duration:
+        # Only fresh transcriptions pass a duration; cached ones cost no audio time
+        AUDIO_SECONDS.inc(duration)
+    print(f"Saved transcript to: {transcript_path}")
     
-    # Sort results by chunk number and extract transcribed text
-    sorted_results = sorted(results, key=lambda x: x[0])
-    return [result[1] for result in sorted_results]
+    return {
+        'status': 'success',
+        'transcription': full_transcription,
+        'saved_to': os.path.basename(transcript_path)
+    }
 
-@celery.task
-def process_transcription(file_path, user_session, filename):
+@celery.task(bind=True)
+def process_transcription(self, file_path, user_session, filename):
+    job_id = self.request.id
+    input_path = file_path
+    # Chunks get a directory of their own, so other jobs of the session keep theirs
+    job_dir = os.path.join(current_app.config['TEMP_DIR'], user_session, f"job_{job_id}")
     try:
         print(f"Starting transcription task for file: {filename}")
-        # Process audio file into chunks
-        chunk_paths = process_large_audio(file_path, user_session)
-        print(f"Created {len(chunk_paths)} chunks")
+        cache = get_transcript_cache()
+        cache_key = transcription_cache_key(file_path)
+        
+        cached = cache.get(cache_key)
+        if cached is not None:
+            print("Transcript served from cache")
+            result = save_transcription_result(filename, json.loads(cached))
+            publish_event(job_id, 'done', cached=True)
+            return result
+        
+        # Demux the audio track of videos before chunking
+        publish_event(job_id, 'stage', stage='extracting')
+        file_path = prepare_audio(file_path, user_session, filename)
+        
+        # Chunks are cut lazily by ffmpeg as they are consumed
+        plan = plan_audio_chunks(file_path)
+        publish_event(job_id, 'stage', stage='transcribing', chunks=plan['num_chunks'])
+        chunks = process_large_audio(file_path, user_session, output_dir=job_dir, plan=plan)
         
         # Get OpenAI client
         client = get_openai_client()
         
-        # Transcribe all chunks concurrently
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        transcriptions = loop.run_until_complete(
-            transcribe_chunks_concurrently(client, chunk_paths)
+        # Transcribe chunks concurrently as they are cut
+        chunk_results = transcribe_chunks_concurrently(
+            client,
+            chunks,
+            current_app.config['TRANSCRIPTION_CONCURRENCY'],
+            cache=cache,
+            cache_key=cache_key,
+            job_id=job_id
         )
-        loop.close()
+        print(f"Transcribed {len(chunk_results)} chunks")
         
         # Combine transcriptions
-        full_transcription = ' '.join(transcriptions)
+        transcription = combine_chunk_results(chunk_results)
         print("Transcription completed")
+        cache.put(cache_key, json.dumps(transcription))
         
-        # Save transcript
-        transcript_path = save_transcript(filename, full_transcription)
-        print(f"Saved transcript to: {transcript_path}")
-        
-        return {
-            'status': 'success',
-            'transcription': full_transcription,
-            'saved_to': os.path.basename(transcript_path)
-        }
+        result = save_transcription_result(filename, transcription, plan['duration'])
+        publish_event(job_id, 'done', cached=False)
+        return result
     except Exception as e:
         print(f"Task error: {str(e)}")
+        publish_event(job_id, 'error', message=str(e))
         raise
     finally:
-        cleanup_user_files(user_session)
+        shutil.rmtree(job_dir, ignore_errors=True)
+        # The upload, and the audio extracted from it
+        cleanup_user_files(user_session, input_path, file_path)
 
-@celery.task
-def translate_chunk_task(chunk: str, chunk_num: int) -> tuple[int, str]:
-    """Translate a single chunk as a Celery task"""
+@celery.task(bind=True)
+def dispatch_transcription(self, file_path, user_session, filename):
+    """Cut the upload into shared chunks and transcribe them as a chord of chunk tasks"""
+    job_id = self.request.id
+    job_dir = os.path.join(current_app.config['CHUNKS_DIR'], job_id)
+    input_path = file_path
+    dispatched = False
     try:
-        print(f"Translating chunk {chunk_num}")
-        client = get_openai_client()
+        print(f"Starting fan-out transcription for file: {filename}")
+        cache = get_transcript_cache()
+        cache_key = transcription_cache_key(file_path)
         
-        # Use synchronous API call
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": """You are a professional translator. 
-Translate English to Chinese while:
-1. Maintaining the original meaning accurately
-2. Using natural and fluent Chinese expressions
-3. Preserving any markdown formatting
-4. Keeping section headings in both English and Chinese"""},
-                {"role": "user", "content": f"Translate to Chinese:\n\n{chunk}"}
-            ],
-            temperature=0.3
+        cached = cache.get(cache_key)
+        if cached is not None:
+            print("Transcript served from cache")
+            result = save_transcription_result(filename, json.loads(cached))
+            publish_event(job_id, 'done', cached=True)
+            return result
+        
+        publish_event(job_id, 'stage', stage='extracting')
+        file_path = prepare_audio(file_path, user_session, filename)
+        
+        os.makedirs(job_dir, exist_ok=True)
+        publish_event(job_id, 'stage', stage='splitting')
+        plan = plan_audio_chunks(file_path)
+        chunks = list(process_large_audio(file_path, user_session, output_dir=job_dir, plan=plan))
+        publish_event(job_id, 'stage', stage='transcribing', chunks=len(chunks))
+        
+        if len(chunks) == 1:
+            # Nothing to fan out, transcribe in place
+            chunk_path, start = chunks[0]
+            _, chunk_result = transcribe_chunk(get_openai_client(), chunk_path, 0, cache, cache_key, job_id, start)
+            transcription = combine_chunk_results([chunk_result])
+            cache.put(cache_key, json.dumps(transcription))
+            result = save_transcription_result(filename, transcription, plan['duration'])
+            publish_event(job_id, 'done', cached=False)
+            return result
+        
+        print(f"Dispatching {len(chunks)} chunk tasks")
+        header = group(
+            transcribe_chunk_task.s(chunk_path, i, cache_key, job_id, start)
+            for i, (chunk_path, start) in enumerate(chunks)
+        )
+        callback = combine_transcriptions.s(filename, job_dir, cache_key, job_id, plan['duration']).on_error(
+            cleanup_chunk_dir.si(job_dir, job_id)
         )
+        # The chord inherits this task's id, so /task/<id> resolves to the callback result
+        raise self.replace(chord(header, callback))
+    except Ignore:
+        # Replaced by the chord, whose callback removes the chunks once it has run
+        dispatched = True
+        raise
+    except Exception as e:
+        print(f"Task error: {str(e)}")
+        publish_event(job_id, 'error', message=str(e))
+        raise
+    finally:
+        if not dispatched:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        # The upload, and the audio extracted from it
+        cleanup_user_files(user_session, input_path, file_path)
+
+@celery.task
+def transcribe_chunk_task(chunk_path: str, chunk_num: int, cache_key: str = None,
+                          job_id: str = None, start: float = 0.0) -> tuple[int, dict]:
+    """Transcribe a single chunk from shared storage as a Celery task"""
+    return transcribe_chunk(
+        get_openai_client(), chunk_path, chunk_num, get_transcript_cache(), cache_key, job_id, start
+    )
+
+@celery.task
+def combine_transcriptions(results, filename: str, job_dir: str, cache_key: str = None, job_id: str = None,
+                           duration: float = None):
+    """Join transcribed chunks in order and save the transcript"""
+    try:
+        sorted_results = sorted(results, key=lambda x: x[0])
+        transcription = combine_chunk_results([result[1] for result in sorted_results])
+        print(f"Combined {len(results)} transcribed chunks")
         
-        result = (chunk_num, response.choices[0].message.content)
-        print(f"Chunk {chunk_num} translated")
+        if cache_key:
+            get_transcript_cache().put(cache_key, json.dumps(transcription))
+        result = save_transcription_result(filename, transcription, duration)
+        publish_event(job_id, 'done', cached=False)
         return result
+    except Exception as e:
+        publish_event(job_id, 'error', message=str(e))
+        raise
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+@celery.task
+def cleanup_chunk_dir(job_dir: str, job_id: str = None):
+    """Remove a fan-out job's chunks after a failed chunk task"""
+    shutil.rmtree(job_dir, ignore_errors=True)
+    publish_event(job_id, 'error', message='A chunk failed to transcribe')
+
+def complete_chat(messages: List[dict], on_text: Callable[[str], None] = None) -> tuple:
+    """Run a chat completion, returning its content and finish reason.
+
+    With on_text the reply is streamed and each piece of text is passed to
+    it as soon as it arrives.
+    """
+    client = get_openai_client()
+    with span('openai.chat', {'gen_ai.request.model': LLM_MODEL, 'transcriber.stream': on_text is not None}):
+        if on_text is None:
+            response = client.chat.completions.create(model=LLM_MODEL, messages=messages, temperature=LLM_TEMPERATURE)
+            choice = response.choices[0]
+            content, finish_reason = choice.message.content or "", choice.finish_reason
+            usage = (response.usage.prompt_tokens, response.usage.completion_tokens) if response.usage else None
+        else:
+            stream = client.chat.completions.create(
+                model=LLM_MODEL, messages=messages, temperature=LLM_TEMPERATURE, stream=True
+            )
+            parts = []
+            finish_reason = None
+            for event in stream:
+                if not event.choices:
+                    continue
+                choice = event.choices[0]
+                if choice.delta.content:
+                    parts.append(choice.delta.content)
+                    on_text(choice.delta.content)
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+            content = "".join(parts)
+            # Streamed replies carry no usage, so both sides are counted here
+            usage = (sum(count_tokens(m['content']) for m in messages), count_tokens(content))
         
+        if usage:
+            record_llm_tokens(LLM_MODEL, *usage)
+            set_attributes({'gen_ai.usage.input_tokens': usage[0], 'gen_ai.usage.output_tokens': usage[1]})
+        set_attributes({'gen_ai.response.finish_reasons': [finish_reason or '']})
+    return content, finish_reason
+
+def cached_chat_completion(system_prompt: str, user_prompt: str, chunk: str,
+                           on_text: Callable[[str], None] = None) -> str:
+    """Run a chat completion on one chunk, memoized on the prompts, model, temperature and text"""
+    cache = get_llm_cache()
+    cache_key = llm_cache_key(system_prompt + user_prompt, LLM_MODEL, LLM_TEMPERATURE, chunk)
+    
+    try:
+        cached = cache.get(cache_key)
+    except Exception as e:
+        print(f"LLM cache lookup failed: {e}")
+        cached = None
+    if cached is not None:
+        return cached
+    
+    content, _ = complete_chat([
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt.format(chunk=chunk)}
+    ], on_text)
+    
+    try:
+        cache.put(cache_key, content)
     except Exception as e:
-        print(f"Error translating chunk {chunk_num}: {e}")
-        return chunk_num, chunk
+        print(f"LLM cache store failed: {e}")
+    return content
+
+def parse_batch_response(content: str, count: int, complete: bool) -> List[str]:
+    """Return the texts of the leading segments that can be trusted, in order.
+
+    Segments are read while they are numbered 1, 2, 3... The last one read
+    may have absorbed a segment whose marker was dropped, or be cut off, so
+    it is only kept when the reply is complete and covers every segment.
+    """
+    matches = list(BATCH_MARKER_PATTERN.finditer(content))
+    texts = []
+    for match, following in zip(matches, matches[1:] + [None]):
+        if int(match.group(1)) != len(texts) + 1:
+            break
+        text = content[match.end():following.start() if following else len(content)].strip()
+        if not text:
+            break
+        texts.append(text)
+    if not (complete and len(texts) == count):
+        texts = texts[:-1]
+    return texts[:count]
+
+def could_become_marker(line: str) -> bool:
+    """Whether an unfinished line may still turn out to be a segment marker"""
+    stripped = line.strip()
+    prefix = BATCH_MARKER.format("")[:-3]
+    if len(stripped) <= len(prefix):
+        return prefix.startswith(stripped)
+    return re.fullmatch(r'<<<SEGMENT \d*>{0,3}', stripped) is not None
+
+class SegmentStream:
+    """Split a streamed batch reply into its segments as it arrives.
+
+    Text is passed to on_delta(segment_number, text) without the marker
+    lines; a line is only held back while it could still become a marker.
+    """
+
+    def __init__(self, on_delta: Callable[[int, str], None]):
+        self.on_delta = on_delta
+        self.segment = None
+        self.pending = ""
+        self.in_text_line = False
+
+    def feed(self, text: str):
+        self.pending += text
+        while self.pending:
+            newline = self.pending.find("\n")
+            if self.in_text_line:
+                end = len(self.pending) if newline == -1 else newline + 1
+                self._emit(self.pending[:end])
+                self.pending = self.pending[end:]
+                self.in_text_line = newline == -1
+                continue
+            
+            if newline == -1:
+                if could_become_marker(self.pending):
+                    return
+                self.in_text_line = True
+                continue
+            
+            line = self.pending[:newline]
+            marker = BATCH_MARKER_PATTERN.fullmatch(line)
+            if marker:
+                self.segment = int(marker.group(1))
+            else:
+                self._emit(self.pending[:newline + 1])
+            self.pending = self.pending[newline + 1:]
+
+    def close(self):
+        if self.pending and not BATCH_MARKER_PATTERN.fullmatch(self.pending):
+            self._emit(self.pending)
+        self.pending = ""
+
+    def _emit(self, text: str):
+        if self.segment is not None:
+            self.on_delta(self.segment, text)
+
+def batched_chat_completion(system_prompt: str, user_prompt: str, chunks: List[str],
+                            on_delta: Callable[[int, str], None] = None, stage: str = 'llm') -> List[str]:
+    """Run a chat completion over several chunks with a single request.
+
+    Each chunk keeps its own cache entry, so cached chunks are not resent and
+    results are shared with per-chunk requests. Chunks missing from a reply
+    that was cut off or did not follow the segment format are retried on
+    their own. With on_delta the replies are streamed, passing each piece
+    of text to on_delta(chunk_position, text).
+    """
+    cache = get_llm_cache()
+    cache_keys = [llm_cache_key(system_prompt + user_prompt, LLM_MODEL, LLM_TEMPERATURE, chunk) for chunk in chunks]
+    results = [None] * len(chunks)
+    for i, cache_key in enumerate(cache_keys):
+        try:
+            results[i] = cache.get(cache_key)
+        except Exception as e:
+            print(f"LLM cache lookup failed: {e}")
+    
+    missing = [i for i, result in enumerate(results) if result is None]
+    CHUNKS.labels(stage, 'true').inc(len(chunks) - len(missing))
+    CHUNKS.labels(stage, 'false').inc(len(missing))
+    if len(missing) > 1:
+        batch_text = "\n\n".join(
+            f"{BATCH_MARKER.format(n)}\n{chunks[i]}" for n, i in enumerate(missing, start=1)
+        )
+        segments = None
+        if on_delta is not None:
+            segments = SegmentStream(
+                lambda n, text: on_delta(missing[n - 1], text) if 1 <= n <= len(missing) else None
+            )
+        content, finish_reason = complete_chat([
+            {"role": "system", "content": system_prompt + BATCH_INSTRUCTIONS},
+            {"role": "user", "content": user_prompt.format(chunk=batch_text)}
+        ], segments.feed if segments else None)
+        if segments:
+            segments.close()
+        # A reply cut off at the output limit stops with 'length'
+        parsed = parse_batch_response(content, len(missing), finish_reason == 'stop')
+        
+        for i, text in zip(missing, parsed):
+            results[i] = text
+            try:
+                cache.put(cache_keys[i], text)
+            except Exception as e:
+                print(f"LLM cache store failed: {e}")
+        if len(parsed) < len(missing):
+            print(f"Batched reply covered {len(parsed)} of {len(missing)} chunks, retrying the rest one by one")
+    
+    for i, result in enumerate(results):
+        if result is None:
+            on_text = (lambda text, i=i: on_delta(i, text)) if on_delta else None
+            results[i] = cached_chat_completion(system_prompt, user_prompt, chunks[i], on_text)
+    return results
+
+def run_batch(system_prompt: str, user_prompt: str, batch: List[tuple], job_id: str, stage: str) -> List[tuple]:
+    """Complete a batch of (index, chunk) pairs, returning (index, text) pairs.
+
+    The replies are streamed to the job's text stream while they arrive, and
+    each chunk event carries the chunk's final text.
+    """
+    indices = [index for index, _ in batch]
+    chunks = [chunk for _, chunk in batch]
+    relay = DeltaRelay(job_id) if job_id else None
+    on_delta = (lambda position, text: relay.add(indices[position], text)) if relay else None
+    try:
+        print(f"Running {stage} on chunks {indices[0]}-{indices[-1]} in one batch")
+        with time_stage(stage), span(f"{stage} batch", {'transcriber.job_id': job_id,
+                                                        'transcriber.chunks': f"{indices[0]}-{indices[-1]}"}):
+            texts = batched_chat_completion(system_prompt, user_prompt, chunks, on_delta, stage)
+        failed = False
+    except Exception as e:
+        print(f"Error running {stage} on chunks {indices[0]}-{indices[-1]}: {e}")
+        texts = chunks
+        failed = True
+    
+    if relay:
+        relay.flush()
+    for index, text in zip(indices, texts):
+        publish_event(job_id, 'chunk', index=index, text=text, failed=failed)
+    return list(zip(indices, texts))
+
+@celery.task
+def translate_batch_task(batch: List[tuple], job_id: str = None) -> List[tuple]:
+    """Translate a batch of (index, chunk) pairs as a Celery task"""
+    return run_batch(TRANSLATION_SYSTEM_PROMPT, TRANSLATION_USER_PROMPT, batch, job_id, 'translate')
 
 @celery.task
 def combine_translations(results):
-    """Combine translated chunks in correct order"""
+    """Combine the batches of translated chunks in correct order"""
     try:
         # Sort results by chunk number
-        sorted_results = sorted(results, key=lambda x: x[0])
+        sorted_results = sorted((pair for batch in results for pair in batch), key=lambda x: x[0])
         translated_text = "\n".join(result[1] for result in sorted_results)
-        print(f"Combined {len(results)} translations")
+        print(f"Combined {len(sorted_results)} translations")
         return translated_text
     except Exception as e:
         print(f"Error combining translations: {e}")
         return ""
 
 @celery.task
-def save_translation_task(translation: str, filename: str):
+def save_translation_task(translation: str, filename: str, job_id: str = None):
     """Save translation and return the translated text"""
     try:
-        # Get the transcripts directory from config
-        from app import create_app
-        app = create_app()
-        
-        with app.app_context():
-            # Read existing file
-            file_path = os.path.join(app.config['TRANSCRIPTS_DIR'], filename)
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Get English content
-            english_content = content.split('## Chinese Content')[0].strip()
-            
-            # Create new content with both versions
-            new_content = f"{english_content}\n\n## Chinese Content / 中文内容\n\n{translation}"
-            
-            # Save updated content
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(new_content)
-                
-            return {'status': 'completed', 'translation': translation}
+        # Only the Chinese layer is written; the markdown is re-rendered from the layers
+        update_layer(filename, 'chinese', translation)
+
+        publish_event(job_id, 'done')
+        return {'status': 'completed', 'translation': translation}
     except Exception as e:
         print(f"Error saving translation: {e}")
+        publish_event(job_id, 'error', message=str(e))
         return {'status': 'error', 'translation': translation}
 
 @celery.task
-def process_chunk_task(chunk: str, chunk_num: int) -> tuple[int, str]:
-    """Process a single chunk as a Celery task"""
-    try:
-        print(f"Processing chunk {chunk_num}")
-        client = get_openai_client()
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": """You are a transcript editor. Your task is to:
-1. Format the text into proper paragraphs
-2. Add appropriate punctuation where needed
-3. Fix obvious transcription errors
-4. Keep the original meaning and all content intact
-5. Do not add any commentary or additional content
-6. Do not add section headings or markdown formatting
-Just focus on making the text more readable with proper paragraphing."""},
-                {"role": "user", "content": f"Format this transcript chunk into proper paragraphs:\n\n{chunk}"}
-            ],
-            temperature=0.3
-        )
-        
-        result = (chunk_num, response.choices[0].message.content)
-        print(f"Chunk {chunk_num} processed")
-        return result
-        
-    except Exception as e:
-        print(f"Error processing chunk {chunk_num}: {e}")
-        return chunk_num, chunk
+def process_batch_task(batch: List[tuple], job_id: str = None) -> List[tuple]:
+    """Format a batch of (index, chunk) pairs as a Celery task"""
+    return run_batch(FORMAT_SYSTEM_PROMPT, FORMAT_USER_PROMPT, batch, job_id, 'format')
 
 @celery.task
 def combine_processed_chunks(results):
-    """Combine processed chunks in correct order"""
+    """Combine the batches of processed chunks in correct order"""
     try:
         # Sort results by chunk number
-        sorted_results = sorted(results, key=lambda x: x[0])
+        sorted_results = sorted((pair for batch in results for pair in batch), key=lambda x: x[0])
         processed_text = "\n\n".join(result[1] for result in sorted_results)
-        print(f"Combined {len(results)} processed chunks")
+        print(f"Combined {len(sorted_results)} processed chunks")
         return processed_text
     except Exception as e:
         print(f"Error combining processed chunks: {e}")
         return ""
 
 @celery.task
-def save_processed_text(processed_text: str, filename: str):
+def save_processed_text(processed_text: str, filename: str, job_id: str = None):
     """Save processed text and return it"""
     try:
-        # Get the transcripts directory from config
-        from app import create_app
-        app = create_app()
-        
-        with app.app_context():
-            # Read existing file to preserve any translations
-            file_path = os.path.join(app.config['TRANSCRIPTS_DIR'], filename)
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Check if file has Chinese translation
-            sections = content.split('## Chinese Content')
-            if len(sections) > 1:
-                chinese_content = sections[1]
-                new_content = f"""# Transcript: {filename}
-Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-
-## English Content
+        # The raw transcript and any translation are kept in their own layers
+        update_layer(filename, 'processed', processed_text)
 
-{processed_text}
-
-## Chinese Content{chinese_content}"""
-            else:
-                new_content = f"""# Transcript: {filename}
-Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-
-## English Content
-
-{processed_text}"""
-            
-            # Save updated content
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(new_content)
-                
-            return {'status': 'completed', 'processed_text': processed_text}
+        publish_event(job_id, 'done')
+        return {'status': 'completed', 'processed_text': processed_text}
     except Exception as e:
         print(f"Error saving processed text: {e}")
+        publish_event(job_id, 'error', message=str(e))
         return {'status': 'error', 'processed_text': processed_text}
\ No newline at end of file
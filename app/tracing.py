@@ -0,0 +1,162 @@
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+from flask import request, g
+from config import Config
+from app.metrics import PUBLISHED_AT_HEADER
+
+try:
+    from opentelemetry import trace, propagate, context
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+except ImportError:  # Spans are not recorded without the OpenTelemetry SDK and OTLP exporter
+    trace = None
+    if Config.OTLP_ENDPOINT:
+        print("OTEL_EXPORTER_OTLP_ENDPOINT is set but OpenTelemetry is not installed, tracing is off")
+
+_tracer = None
+# Spans of the Celery tasks running in this process, by task id
+_task_spans = {}
+
+def get_tracer():
+    """The tracer exporting to Config.OTLP_ENDPOINT, or None when tracing is off"""
+    global _tracer
+    if _tracer is None:
+        _tracer = False
+        if trace is not None and Config.OTLP_ENDPOINT:
+            provider = TracerProvider(resource=Resource.create({'service.name': Config.TRACING_SERVICE_NAME}))
+            exporter = OTLPSpanExporter(endpoint=Config.OTLP_ENDPOINT.rstrip('/') + '/v1/traces')
+            provider.add_span_processor(BatchSpanProcessor(exporter))
+            trace.set_tracer_provider(provider)
+            _tracer = trace.get_tracer('transcriber')
+    return _tracer or None
+
+def _attributes(attributes: dict) -> dict:
+    return {key: value for key, value in (attributes or {}).items() if value is not None}
+
+@contextmanager
+def span(name: str, attributes: dict = None):
+    """Run a block in a child span of the current one, yielding the span or None"""
+    tracer = get_tracer()
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name, attributes=_attributes(attributes)) as current:
+        yield current
+
+def set_attributes(attributes: dict):
+    """Add attributes to the current span"""
+    if get_tracer() is not None:
+        trace.get_current_span().set_attributes(_attributes(attributes))
+
+def spanned_iter(items: Iterable, name: str) -> Iterator:
+    """Yield from items, recording how long each one takes to produce as a span"""
+    tracer = get_tracer()
+    if tracer is None:
+        yield from items
+        return
+    iterator = iter(items)
+    index = 0
+    while True:
+        start = time.time_ns()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        except Exception as e:
+            failed = tracer.start_span(name, start_time=start, attributes={'transcriber.index': index})
+            failed.record_exception(e)
+            failed.set_status(Status(StatusCode.ERROR, str(e)))
+            failed.end()
+            raise
+        tracer.start_span(name, start_time=start, attributes={'transcriber.index': index}).end()
+        yield item
+        index += 1
+
+def connect_celery_signals():
+    """Carry the trace through task headers and give every task and its queueing a span"""
+    if get_tracer() is None:
+        return
+    from celery.signals import before_task_publish, task_prerun, task_failure, task_postrun, worker_process_shutdown
+
+    @before_task_publish.connect(weak=False)
+    def inject_context(headers=None, **kwargs):
+        if headers is not None:
+            propagate.inject(headers)
+
+    @task_prerun.connect(weak=False)
+    def start_task_span(task_id=None, task=None, **kwargs):
+        tracer = get_tracer()
+        carrier = {key: task.request.get(key) for key in propagate.get_global_textmap().fields}
+        carrier = {key: value for key, value in carrier.items() if value}
+        # Eager tasks run inline and carry no headers, so they join the current trace
+        parent = propagate.extract(carrier) if carrier else None
+        published_at = task.request.get(PUBLISHED_AT_HEADER)
+        if published_at:
+            # The broker delay before this link of the chain, drawn as its own span
+            queued = tracer.start_span(f"queue {task.name}", context=parent, kind=SpanKind.PRODUCER,
+                                       start_time=int(published_at * 1e9))
+            queued.end()
+        current = tracer.start_span(f"run {task.name}", context=parent, kind=SpanKind.CONSUMER,
+                                    attributes={'celery.task_id': task_id, 'celery.task_name': task.name})
+        _task_spans[task_id] = (current, context.attach(trace.set_span_in_context(current)))
+
+    @task_failure.connect(weak=False)
+    def record_task_failure(task_id=None, exception=None, **kwargs):
+        if task_id in _task_spans:
+            current = _task_spans[task_id][0]
+            current.record_exception(exception)
+            current.set_status(Status(StatusCode.ERROR, str(exception)))
+
+    @task_postrun.connect(weak=False)
+    def end_task_span(task_id=None, state=None, **kwargs):
+        if task_id not in _task_spans:
+            return
+        current, token = _task_spans.pop(task_id)
+        current.set_attribute('celery.state', state or 'UNKNOWN')
+        current.end()
+        context.detach(token)
+
+    @worker_process_shutdown.connect(weak=False)
+    def flush_spans(**kwargs):
+        trace.get_tracer_provider().force_flush()
+
+def init_app(app):
+    """Start a trace for every request, continuing one passed in a traceparent header"""
+    if get_tracer() is None:
+        return
+
+    @app.before_request
+    def start_request_span():
+        rule = request.url_rule.rule if request.url_rule else 'unmatched'
+        current = get_tracer().start_span(
+            f"{request.method} {rule}",
+            context=propagate.extract(request.headers),
+            kind=SpanKind.SERVER,
+            attributes={'http.request.method': request.method, 'http.route': rule, 'url.path': request.path}
+        )
+        g.trace_span = current
+        g.trace_token = context.attach(trace.set_span_in_context(current))
+
+    @app.after_request
+    def record_status(response):
+        current = g.get('trace_span')
+        if current is not None:
+            current.set_attribute('http.response.status_code', response.status_code)
+            if response.status_code >= 500:
+                current.set_status(Status(StatusCode.ERROR))
+        return response
+
+    @app.teardown_request
+    def end_request_span(exception=None):
+        current = g.pop('trace_span', None)
+        if current is None:
+            return
+        if exception is not None:
+            current.record_exception(exception)
+            current.set_status(Status(StatusCode.ERROR, str(exception)))
+        current.end()
+        context.detach(g.pop('trace_token'))
@@ -0,0 +1,352 @@
+import os
+import json
+import time
+import uuid
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List, Optional
+from flask import current_app
+from werkzeug.utils import secure_filename
+from app.catalog import parse_transcript, split_sections, record_transcript, update_transcript_section, DATE_FORMAT
+from app.downloads import precompress_file
+from app.tracing import span
+
+LAYERS = ('english', 'processed', 'chinese')
+META_NAME = 'meta.json'
+SEGMENTS_NAME = 'segments.json'
+CHINESE_HEADING = '## Chinese Content / 中文内容'
+MARKDOWN_HEADER = "# Transcript: {original_name}\nGenerated on: {created_at}\n\n## English Content\n\n"
+CHINESE_PREFIX = f"\n{CHINESE_HEADING}\n\n"
+
+def write_atomic(path: str, text: str):
+    """Replace a file's content in one step, so readers never see a partial write"""
+    with span('file.write', {'file.path': path, 'file.size': len(text)}):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+                # Flushed to disk first, so the rename never exposes an empty file after a crash
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+class TranscriptLockTimeout(Exception):
+    pass
+
+def _remove_lock_if(lock_path: str, token: str, owned) -> bool:
+    """Remove a lock file if owned(path) holds for it, else leave it in place.
+
+    The lock is first renamed to a path only this caller uses and checked
+    there, so a lock taken by another writer between a check and the
+    removal is never deleted. A lock that fails the check is linked back,
+    which never replaces a lock taken meanwhile.
+    """
+    moved_path = f"{lock_path}.{token}"
+    try:
+        os.rename(lock_path, moved_path)
+    except FileNotFoundError:
+        return False
+    try:
+        if owned(moved_path):
+            return True
+        try:
+            os.link(moved_path, lock_path)
+        except FileExistsError:
+            print(f"Lock {lock_path} was replaced while it was checked")
+        return False
+    finally:
+        os.unlink(moved_path)
+
+@contextmanager
+def transcript_lock(filename: str):
+    """Hold the write lock of one transcript, across processes and hosts.
+
+    The lock is a file created with O_EXCL next to the records, which is
+    atomic on local and network filesystems alike. A lock left by a writer
+    that crashed is broken once it is older than TRANSCRIPT_LOCK_STALE_SECONDS.
+    """
+    lock_path = record_dir(filename) + '.lock'
+    token = uuid.uuid4().hex
+    stale_seconds = current_app.config['TRANSCRIPT_LOCK_STALE_SECONDS']
+    deadline = time.monotonic() + current_app.config['TRANSCRIPT_LOCK_TIMEOUT']
+    delay = 0.005
+
+    def is_stale(path: str) -> bool:
+        return time.time() - os.path.getmtime(path) > stale_seconds
+
+    def is_ours(path: str) -> bool:
+        with open(path, 'r') as f:
+            return f.read() == token
+
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            with os.fdopen(fd, 'w') as f:
+                f.write(token)
+            break
+        except FileExistsError:
+            pass
+
+        try:
+            if is_stale(lock_path):
+                # Checked again once moved aside, as another waiter may have broken it and locked afresh
+                if _remove_lock_if(lock_path, token, is_stale):
+                    print(f"Broke stale lock on {filename}")
+                continue
+        except FileNotFoundError:
+            continue
+
+        if time.monotonic() > deadline:
+            raise TranscriptLockTimeout(f"Transcript is locked by another writer: {filename}")
+        time.sleep(delay)
+        delay = min(delay * 2, 0.2)
+
+    try:
+        yield
+    finally:
+        # A lock broken as stale meanwhile belongs to another writer and is left alone
+        _remove_lock_if(lock_path, token, is_ours)
+
+def record_dir(filename: str) -> str:
+    """Directory holding the layers of the transcript published as filename"""
+    return os.path.join(current_app.config['TRANSCRIPT_RECORDS_DIR'], os.path.splitext(filename)[0])
+
+def markdown_path(filename: str) -> str:
+    return os.path.join(current_app.config['TRANSCRIPTS_DIR'], filename)
+
+def new_filename(original_filename: str, suffix: str = '') -> str:
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base_name = os.path.splitext(original_filename)[0]
+    return secure_filename(f"{base_name}{suffix}_{timestamp}.md")
+
+def load_meta(filename: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(record_dir(filename), META_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def layer_path(filename: str, layer: str) -> str:
+    return os.path.join(record_dir(filename), f"{layer}.txt")
+
+def read_layer(filename: str, layer: str) -> Optional[str]:
+    try:
+        with open(layer_path(filename, layer), 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def layer_size(filename: str, layer: str) -> int:
+    try:
+        return os.path.getsize(layer_path(filename, layer))
+    except FileNotFoundError:
+        return 0
+
+def load_segments(filename: str) -> List[dict]:
+    try:
+        with open(os.path.join(record_dir(filename), SEGMENTS_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+def markdown_size(meta: dict, english_bytes: int, chinese_bytes: int) -> int:
+    """Size of the markdown render_markdown produces, from the byte sizes of the shown layers"""
+    size = len(MARKDOWN_HEADER.format(**meta).encode('utf-8')) + english_bytes + 1
+    if chinese_bytes:
+        size += len(CHINESE_PREFIX.encode('utf-8')) + chinese_bytes + 1
+    return size
+
+def catalog_record(filename: str, meta: dict, english: str, chinese: str) -> dict:
+    """The catalog entry of a transcript whose shown English and Chinese text are given"""
+    english_bytes, chinese_bytes = len(english.encode('utf-8')), len(chinese.encode('utf-8'))
+    return {
+        'filename': filename,
+        'original_name': meta['original_name'],
+        'created_at': datetime.strptime(meta['created_at'], DATE_FORMAT).timestamp(),
+        'duration': meta['duration'],
+        'english': english,
+        'chinese': chinese,
+        'size': markdown_size(meta, english_bytes, chinese_bytes),
+        'sections': ['english', 'chinese'] if chinese else ['english'],
+    }
+
+def load_record(filename: str) -> Optional[dict]:
+    """Read a transcript's catalog entry from its layers"""
+    meta = load_meta(filename)
+    if meta is None:
+        return None
+    english = read_layer(filename, 'processed') or read_layer(filename, 'english') or ''
+    return catalog_record(filename, meta, english, read_layer(filename, 'chinese') or '')
+
+def iter_records() -> Iterator[dict]:
+    """Catalog entries of every transcript stored as layers"""
+    records_dir = current_app.config['TRANSCRIPT_RECORDS_DIR']
+    if not os.path.isdir(records_dir):
+        return
+    for name in sorted(os.listdir(records_dir)):
+        if os.path.isdir(os.path.join(records_dir, name)):
+            record = load_record(f"{name}.md")
+            if record is not None:
+                yield record
+
+def create_transcript(original_filename: str, english: str, segments: List[dict] = None,
+                      chinese: str = None, duration: float = None, suffix: str = '') -> str:
+    """Store a new transcript as separate layers and index it; returns its markdown path.
+
+    The markdown itself is only rendered when it is first downloaded.
+    """
+    filename = new_filename(original_filename, suffix)
+    # Creating the record directory claims the name, so two uploads saved
+    # in the same second never share a transcript
+    attempt = 1
+    while True:
+        directory = record_dir(filename)
+        try:
+            os.mkdir(directory)
+            break
+        except FileExistsError:
+            attempt += 1
+            filename = new_filename(original_filename, f"{suffix}_{attempt}")
+
+    write_atomic(os.path.join(directory, 'english.txt'), english)
+    if chinese:
+        write_atomic(os.path.join(directory, 'chinese.txt'), chinese)
+    write_atomic(os.path.join(directory, SEGMENTS_NAME), json.dumps(segments or []))
+    # The metadata goes last: a record without it is not considered saved
+    meta = {
+        'original_name': original_filename,
+        'created_at': datetime.now().strftime(DATE_FORMAT),
+        'duration': duration,
+    }
+    write_atomic(os.path.join(directory, META_NAME), json.dumps(meta))
+    record_transcript(catalog_record(filename, meta, english, chinese or ''))
+    return markdown_path(filename)
+
+def import_markdown(filename: str):
+    """Split a transcript saved before layers existed into a record"""
+    with open(markdown_path(filename), 'r', encoding='utf-8') as f:
+        content = f.read()
+    parsed = parse_transcript(filename, content)
+    english, chinese = split_sections(content)
+    directory = record_dir(filename)
+    os.makedirs(directory, exist_ok=True)
+
+    write_atomic(os.path.join(directory, 'english.txt'), english.strip())
+    if chinese.strip():
+        write_atomic(os.path.join(directory, 'chinese.txt'), chinese.strip())
+    write_atomic(os.path.join(directory, SEGMENTS_NAME), '[]')
+    created_at = parsed['created_at'] or os.path.getmtime(markdown_path(filename))
+    write_atomic(os.path.join(directory, META_NAME), json.dumps({
+        'original_name': parsed['original_name'],
+        'created_at': datetime.fromtimestamp(created_at).strftime(DATE_FORMAT),
+        'duration': None,
+    }))
+
+def update_layer(filename: str, layer: str, text: str):
+    """Replace one layer of a transcript and re-index the section it shows in.
+
+    Only the layer's own file is written and only its text is indexed, so
+    the cost of an update does not grow with the rest of the transcript.
+    The markdown is re-rendered on its next download. Writers of the same
+    transcript are serialized.
+    """
+    if layer not in LAYERS:
+        raise ValueError(f"Unknown layer: {layer}")
+    if filename != secure_filename(filename):
+        raise ValueError(f"Invalid transcript name: {filename}")
+
+    # Time before the first write under this span is spent waiting for the lock
+    with span('transcript.update', {'transcriber.transcript': filename, 'transcriber.layer': layer}), \
+            transcript_lock(filename):
+        imported = False
+        if load_meta(filename) is None:
+            if not os.path.exists(markdown_path(filename)):
+                raise FileNotFoundError(f"Transcript not found: {filename}")
+            import_markdown(filename)
+            imported = True
+
+        write_atomic(layer_path(filename, layer), text)
+        if imported:
+            # A transcript imported from markdown is indexed from its layers once
+            record_transcript(load_record(filename))
+            return
+
+        if layer == 'chinese':
+            section, shown = 'chinese', text
+        elif layer == 'english' and layer_size(filename, 'processed'):
+            # The English section shows the processed text, which is unchanged
+            return
+        else:
+            # An empty processed layer shows the raw English text again
+            section, shown = 'english', text or read_layer(filename, 'english') or ''
+        english_bytes = layer_size(filename, 'processed') or layer_size(filename, 'english')
+        chinese_bytes = layer_size(filename, 'chinese')
+        size = markdown_size(load_meta(filename), english_bytes, chinese_bytes)
+        sections = ['english', 'chinese'] if chinese_bytes else ['english']
+        if not update_transcript_section(filename, section, shown, size, sections):
+            record_transcript(load_record(filename))
+
+def render_markdown(filename: str) -> str:
+    """Render a transcript's layers as markdown, preferring the processed English text"""
+    meta = load_meta(filename)
+    english = read_layer(filename, 'processed') or read_layer(filename, 'english') or ''
+    chinese = read_layer(filename, 'chinese')
+
+    content = MARKDOWN_HEADER.format(**meta) + english + '\n'
+    if chinese:
+        content += CHINESE_PREFIX + chinese + '\n'
+    return content
+
+def is_rendered(filename: str) -> bool:
+    try:
+        return os.stat(markdown_path(filename)).st_mtime_ns == os.stat(record_dir(filename)).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+def markdown_file(filename: str) -> Optional[str]:
+    """Return the path of a transcript's markdown, rendering it first if its layers changed.
+
+    The markdown is a cache of the layers and is stamped with the record
+    directory's mtime, which every layer write moves. Transcripts saved
+    before layers existed are only markdown and are returned as they are.
+    """
+    if filename != secure_filename(filename):
+        return None
+    file_path = markdown_path(filename)
+    if load_meta(filename) is None:
+        return file_path if os.path.isfile(file_path) else None
+    if is_rendered(filename):
+        return file_path
+
+    with transcript_lock(filename):
+        if not is_rendered(filename):
+            version = os.stat(record_dir(filename)).st_mtime_ns
+            write_atomic(file_path, render_markdown(filename))
+            os.utime(file_path, ns=(version, version))
+            precompress_file(file_path, current_app.config['PRECOMPRESS_MIN_BYTES'])
+    return file_path
+
+def format_timestamp(seconds: float, separator: str) -> str:
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+def render_srt(segments: List[dict]) -> str:
+    return '\n'.join(
+        f"{i}\n{format_timestamp(s['start'], ',')} --> {format_timestamp(s['end'], ',')}\n{s['text']}\n"
+        for i, s in enumerate(segments, start=1)
+    )
+
+def render_vtt(segments: List[dict]) -> str:
+    cues = ''.join(
+        f"\n{format_timestamp(s['start'], '.')} --> {format_timestamp(s['end'], '.')}\n{s['text']}\n"
+        for s in segments
+    )
+    return f"WEBVTT\n{cues}"
@@ -0,0 +1,159 @@
+import os
+import re
+import json
+import math
+import uuid
+import time
+import shutil
+import hashlib
+import tempfile
+from typing import List
+from werkzeug.utils import secure_filename
+
+MANIFEST_NAME = 'manifest.json'
+DATA_NAME = 'data'
+PARTS_DIR = 'parts'
+STREAM_BLOCK_SIZE = 64 * 1024
+
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+UPLOAD_DIR_PREFIX = 'upload_'
+
+def get_upload_dir(user_temp_dir: str, upload_id: str) -> str:
+    """Return the directory of an upload, rejecting ids that are not ours"""
+    if not UPLOAD_ID_PATTERN.match(upload_id):
+        raise ValueError('Invalid upload id')
+    upload_dir = os.path.join(user_temp_dir, f"{UPLOAD_DIR_PREFIX}{upload_id}")
+    if not os.path.exists(os.path.join(upload_dir, MANIFEST_NAME)):
+        raise FileNotFoundError('Upload not found')
+    return upload_dir
+
+def create_upload(user_temp_dir: str, filename: str, size: int, part_size: int) -> dict:
+    """Start a resumable upload and preallocate its data file"""
+    upload_id = uuid.uuid4().hex
+    upload_dir = os.path.join(user_temp_dir, f"{UPLOAD_DIR_PREFIX}{upload_id}")
+    os.makedirs(os.path.join(upload_dir, PARTS_DIR))
+
+    manifest = {
+        'upload_id': upload_id,
+        'filename': filename,
+        'size': size,
+        'part_size': part_size,
+        'parts': max(1, math.ceil(size / part_size)),
+    }
+    with open(os.path.join(upload_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    # Parts are written in place at their offsets, in any order
+    with open(os.path.join(upload_dir, DATA_NAME), 'wb') as f:
+        f.truncate(size)
+
+    return manifest
+
+def list_uploads(user_temp_dir: str) -> List[str]:
+    """Return the directories of the uploads in progress in a session"""
+    if not os.path.isdir(user_temp_dir):
+        return []
+    return [
+        os.path.join(user_temp_dir, name) for name in os.listdir(user_temp_dir)
+        if name.startswith(UPLOAD_DIR_PREFIX) and UPLOAD_ID_PATTERN.match(name[len(UPLOAD_DIR_PREFIX):])
+    ]
+
+def last_activity(upload_dir: str) -> float:
+    """When a part was last written to an upload, or when it was started"""
+    times = []
+    for name in (MANIFEST_NAME, DATA_NAME, PARTS_DIR):
+        try:
+            times.append(os.path.getmtime(os.path.join(upload_dir, name)))
+        except OSError:
+            pass
+    return max(times, default=0)
+
+def expire_uploads(temp_dir: str, max_age: float) -> int:
+    """Remove the uploads of every session that have seen no part for max_age seconds"""
+    if not os.path.isdir(temp_dir):
+        return 0
+    cutoff = time.time() - max_age
+    expired = 0
+    for session_name in os.listdir(temp_dir):
+        for upload_dir in list_uploads(os.path.join(temp_dir, session_name)):
+            if last_activity(upload_dir) < cutoff:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+                expired += 1
+    return expired
+
+def load_manifest(upload_dir: str) -> dict:
+    with open(os.path.join(upload_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def part_length(manifest: dict, part_number: int) -> int:
+    offset = part_number * manifest['part_size']
+    return min(manifest['part_size'], manifest['size'] - offset)
+
+def write_part(upload_dir: str, manifest: dict, part_number: int, stream, expected_sha256: str = None) -> str:
+    """Stream one part into the data file at its offset and record it once verified.
+
+    The part only counts as received when its length matches and, if the
+    client sent one, its SHA-256 digest matches; otherwise the client simply
+    sends it again and the region is overwritten. A part received before is
+    forgotten as soon as it is resent.
+    """
+    if not 0 <= part_number < manifest['parts']:
+        raise ValueError(f"Part number out of range: {part_number}")
+
+    expected_length = part_length(manifest, part_number)
+    digest = hashlib.sha256()
+    received = 0
+
+    # A resent part no longer counts as received until it verifies, since its region is overwritten
+    parts_dir = os.path.join(upload_dir, PARTS_DIR)
+    marker_path = os.path.join(parts_dir, str(part_number))
+    try:
+        os.remove(marker_path)
+    except FileNotFoundError:
+        pass
+
+    with open(os.path.join(upload_dir, DATA_NAME), 'r+b') as f:
+        f.seek(part_number * manifest['part_size'])
+        while True:
+            block = stream.read(STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            received += len(block)
+            if received > expected_length:
+                raise ValueError(f"Part {part_number} is larger than {expected_length} bytes")
+            digest.update(block)
+            f.write(block)
+
+    if received != expected_length:
+        raise ValueError(f"Part {part_number} is incomplete: got {received} of {expected_length} bytes")
+
+    part_digest = digest.hexdigest()
+    if expected_sha256 and expected_sha256.lower() != part_digest:
+        raise ValueError(f"Checksum mismatch for part {part_number}")
+
+    # Marker files are written atomically, so concurrent parts never conflict
+    fd, tmp_path = tempfile.mkstemp(dir=parts_dir)
+    with os.fdopen(fd, 'w') as marker:
+        marker.write(part_digest)
+    os.replace(tmp_path, marker_path)
+
+    return part_digest
+
+def received_parts(upload_dir: str) -> List[int]:
+    """Return the sorted numbers of the parts that have been verified"""
+    return sorted(
+        int(name) for name in os.listdir(os.path.join(upload_dir, PARTS_DIR))
+        if name.isdigit()
+    )
+
+def complete_upload(upload_dir: str, manifest: dict, destination_dir: str) -> str:
+    """Move a fully received upload into place and remove its bookkeeping"""
+    missing = sorted(set(range(manifest['parts'])) - set(received_parts(upload_dir)))
+    if missing:
+        raise ValueError(f"Upload is missing parts: {missing[:20]}")
+
+    # Prefixed with the upload id, as the session may upload the same name twice
+    destination = os.path.join(destination_dir, f"{manifest['upload_id']}_{secure_filename(manifest['filename'])}")
+    os.replace(os.path.join(upload_dir, DATA_NAME), destination)
+    shutil.rmtree(upload_dir, ignore_errors=True)
+    return destination
@@ -1,78 +1,202 @@
 import os
+import re
+import weakref
+import threading
+import httpx
+from difflib import SequenceMatcher
 from flask import current_app
-from openai import OpenAI
-from pydub import AudioSegment
-import tempfile
-from datetime import datetime
-from werkzeug.utils import secure_filename
-import math
+from openai import OpenAI, AsyncOpenAI
 import asyncio
 import aiohttp
 from typing import List
 from asyncio import Semaphore
 import time
+from app.audio import iter_audio_chunks, extract_audio, plan_chunks
+from app.ratelimit import RateLimiter
+from app.transcripts import create_transcript
+from app.chunking import chunk_text, CHARS_PER_TOKEN
+from app.metrics import (
+    time_stage, timed_iter, record_llm_tokens, openai_http_client, openai_async_http_client, AUDIO_INPUT_BYTES
+)
+from app.tracing import span, spanned_iter
 
-MAX_CONCURRENT_REQUESTS = 3  # Reduced from 5
-TRANSLATION_CHUNK_SIZE = 300  # Reduced from 500
+try:
+    import h2
+except ImportError:  # The OpenAI API is spoken over HTTP/1.1 without h2
+    h2 = None
+
+MAX_CONCURRENT_REQUESTS = 8  # In-flight cap, throughput is governed by the rate limiter
+VIDEO_EXTENSIONS = ('.mp4', '.webm')
+STITCH_WINDOW_WORDS = 20  # Words compared on each side of a chunk seam
+STITCH_MIN_MATCH_WORDS = 3  # Shorter matches are treated as coincidence
+
+_rate_limiter = None
+_openai_client = None
+_openai_client_pid = None
+# AsyncOpenAI clients by event loop, as their connections belong to the loop that opened them
+_async_openai_clients = weakref.WeakKeyDictionary()
+_async_openai_clients_pid = None
+_event_loops = threading.local()
+
+def openai_pool_options() -> dict:
+    """Connection pool settings of OpenAI HTTP clients, from the app config"""
+    http2 = current_app.config['OPENAI_HTTP2']
+    if http2 and h2 is None:
+        print("OPENAI_HTTP2 is set but the h2 package is not installed, using HTTP/1.1")
+        http2 = False
+    return {
+        'limits': httpx.Limits(
+            max_connections=current_app.config['OPENAI_MAX_CONNECTIONS'],
+            max_keepalive_connections=current_app.config['OPENAI_MAX_KEEPALIVE_CONNECTIONS'],
+            keepalive_expiry=current_app.config['OPENAI_KEEPALIVE_EXPIRY']
+        ),
+        'http2': http2,
+    }
 
 def get_openai_client():
-    """Create and return an OpenAI client instance"""
-    api_key = current_app.config['OPENAI_API_KEY']
-    if not api_key:
-        raise ValueError("OpenAI API key not found in configuration")
-    return OpenAI(api_key=api_key)
-
-def process_large_audio(audio_path, user_session):
-    """Process large audio files by splitting them into chunks"""
+    """Return the process-wide OpenAI client, creating it on first use.
+
+    Every task and thread of the process shares its keep-alive connections.
+    A client inherited from a parent process is replaced, since its
+    connections belong to the parent.
+    """
+    global _openai_client, _openai_client_pid
+    if _openai_client is None or _openai_client_pid != os.getpid():
+        api_key = current_app.config['OPENAI_API_KEY']
+        if not api_key:
+            raise ValueError("OpenAI API key not found in configuration")
+        _openai_client = OpenAI(api_key=api_key, http_client=openai_http_client(**openai_pool_options()))
+        _openai_client_pid = os.getpid()
+    return _openai_client
+
+def close_openai_client():
+    """Close the connections of the process-wide OpenAI clients"""
+    global _openai_client
+    if _openai_client is not None and _openai_client_pid == os.getpid():
+        _openai_client.close()
+    _openai_client = None
+    if _async_openai_clients_pid == os.getpid():
+        # Clients of loops that are busy or closed go with their loop
+        for loop, async_client in list(_async_openai_clients.items()):
+            if not loop.is_closed() and not loop.is_running():
+                loop.run_until_complete(async_client.close())
+    _async_openai_clients.clear()
+
+def prepare_audio(file_path, user_session, filename):
+    """Return a path to the audio to transcribe, extracting it first if the upload is a video"""
+    if not filename.lower().endswith(VIDEO_EXTENSIONS):
+        return file_path
+    
+    print("Extracting audio from video")
+    user_temp_dir = os.path.join(current_app.config['TEMP_DIR'], user_session)
+    with time_stage('decode'):
+        audio_path = extract_audio(file_path, user_temp_dir)
+    os.unlink(file_path)
+    print(f"Video converted to audio: {audio_path}")
+    return audio_path
+
+def plan_audio_chunks(audio_path):
+    """Plan how an audio file will be encoded and split for Whisper"""
+    with time_stage('plan'):
+        plan = plan_chunks(
+            audio_path,
+            current_app.config['WHISPER_MAX_UPLOAD_BYTES'],
+            current_app.config['AUDIO_TARGET_BIT_RATE'],
+            current_app.config['AUDIO_MAX_CHUNK_SECONDS'],
+            current_app.config['AUDIO_CHUNK_OVERLAP_SECONDS']
+        )
+    print(f"Chunk plan: {plan['mode']} {plan['codec']} at {plan['bit_rate'] // 1000}kbps, "
+          f"{plan['num_chunks']} chunks of {plan['chunk_seconds']}s, "
+          f"~{plan['expected_bytes'] / (1024*1024):.2f}MB to upload")
+    return plan
+
+def process_large_audio(audio_path, user_session, output_dir=None, plan=None):
+    """Yield (chunk path, start seconds) for an audio file, encoding and splitting it as planned.
+
+    Chunks are written to the user's temp directory unless output_dir is given.
+    """
     try:
         print(f"Starting to process audio file: {audio_path}")
-        audio = AudioSegment.from_file(audio_path)
-        
-        user_temp_dir = os.path.join(current_app.config['TEMP_DIR'], user_session)
         
         # Get file size
         file_size = os.path.getsize(audio_path)
         print(f"File size: {file_size / (1024*1024):.2f}MB")
+        AUDIO_INPUT_BYTES.inc(file_size)
         
-        if file_size <= 10 * 1024 * 1024:  # 10MB
-            print("File is small enough, no need to split")
-            return [audio_path]
-        
-        # Calculate number of chunks needed
-        total_duration = len(audio)
-        chunk_duration = 10 * 60 * 1000  # 10 minutes in milliseconds
-        num_chunks = math.ceil(total_duration / chunk_duration)
-        print(f"Need to split into {num_chunks} chunks")
+        if plan is None:
+            plan = plan_audio_chunks(audio_path)
         
-        chunk_paths = []
-        
-        for i in range(num_chunks):
-            start_time = i * chunk_duration
-            end_time = min((i + 1) * chunk_duration, total_duration)
-            
-            # Extract chunk
-            chunk = audio[start_time:end_time]
-            
-            # Create temporary file for chunk
-            chunk_path = os.path.join(
-                user_temp_dir,
-                f"chunk_{i}_{next(tempfile._get_candidate_names())}.mp3"
-            )
-            
-            # Export chunk with compression
-            chunk.export(
-                chunk_path,
-                format="mp3",
-                parameters=["-q:a", "1"]
-            )
-            
-            chunk_paths.append(chunk_path)
-        
-        return chunk_paths
+        if output_dir is None:
+            output_dir = os.path.join(current_app.config['TEMP_DIR'], user_session)
+        # Each chunk's export is timed while ffmpeg cuts it, not while it is consumed
+        yield from timed_iter(spanned_iter(iter_audio_chunks(
+            audio_path,
+            output_dir,
+            plan,
+            overlap_seconds=current_app.config['AUDIO_CHUNK_OVERLAP_SECONDS'],
+            align_to_silence=current_app.config['AUDIO_ALIGN_TO_SILENCE'],
+            search_seconds=current_app.config['AUDIO_SILENCE_SEARCH_SECONDS']
+        ), 'audio.export'), 'export')
     except Exception as e:
         print(f"Error in process_large_audio: {str(e)}")
         raise
 
+def normalize_word(word: str) -> str:
+    return re.sub(r'[^\w]', '', word.lower())
+
+def stitch_transcripts(texts: List[str], max_overlap_words: int = STITCH_WINDOW_WORDS) -> str:
+    """Join chunk transcripts whose audio overlaps, dropping the text repeated at each seam.
+
+    The tail of the text so far and the head of the next chunk are compared
+    word by word, ignoring case and punctuation. The longest run they share
+    marks the seam: the left side is kept up to the end of the run and the
+    right side resumes after it, which also discards words cut in half at
+    either chunk edge.
+    """
+    words = []
+    for text in texts:
+        next_words = text.split()
+        if not words:
+            words = next_words
+            continue
+        
+        tail_start = max(len(words) - max_overlap_words, 0)
+        tail = [normalize_word(w) for w in words[tail_start:]]
+        head = [normalize_word(w) for w in next_words[:max_overlap_words]]
+        match = SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+        
+        if match.size >= STITCH_MIN_MATCH_WORDS:
+            words = words[:tail_start + match.a + match.size] + next_words[match.b + match.size:]
+        else:
+            words = words + next_words
+    
+    return ' '.join(words)
+
+def join_transcriptions(texts: List[str]) -> str:
+    """Combine chunk transcripts in order, de-duplicating seams when chunks overlap"""
+    if current_app.config['AUDIO_CHUNK_OVERLAP_SECONDS']:
+        return stitch_transcripts(texts)
+    return ' '.join(texts)
+
+def merge_segments(chunks: List[dict]) -> List[dict]:
+    """Combine the timed segments of ordered chunk results into one timeline.
+
+    Segment times are already absolute. Where chunks overlap, each segment is
+    kept only by the chunk whose own span (from its seam to the next) holds
+    the segment's midpoint, so repeated speech appears once.
+    """
+    overlap = current_app.config['AUDIO_CHUNK_OVERLAP_SECONDS']
+    seams = [chunk['start'] + (overlap if i else 0) for i, chunk in enumerate(chunks)]
+    seams.append(float('inf'))
+    
+    segments = []
+    for i, chunk in enumerate(chunks):
+        for segment in chunk['segments']:
+            middle = (segment['start'] + segment['end']) / 2
+            if seams[i] <= middle < seams[i + 1]:
+                segments.append(segment)
+    return segments
+
 def transcribe_audio_file(client, audio_path):
     """Transcribe a single audio file"""
     try:
@@ -88,59 +212,117 @@ def transcribe_audio_file(client, audio_path):
         print(f"Error in transcribe_audio_file: {str(e)}")
         raise
 
-def save_transcript(original_filename: str, transcript: str, chinese_transcript: str = None) -> str:
-    """Save transcript to a markdown file with optional Chinese translation"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    base_name = os.path.splitext(original_filename)[0]
-    safe_name = secure_filename(f"{base_name}_{timestamp}.md")
-    file_path = os.path.join(current_app.config['TRANSCRIPTS_DIR'], safe_name)
+def save_transcript(original_filename: str, transcript: str, chinese_transcript: str = None,
+                    duration: float = None, segments: List[dict] = None) -> str:
+    """Save a transcript with optional Chinese translation and timed segments, returning its markdown path"""
+    return create_transcript(original_filename, transcript, segments, chinese_transcript, duration)
+
+def cleanup_user_files(user_session, *paths):
+    """Delete a job's temporary files, and the session directory once it is empty.
+
+    Only the given paths are removed: resumable uploads of the same session
+    may still be in progress, and expire_uploads sweeps the abandoned ones.
+    """
+    if not user_session:
+        return
+        
+    for file_path in paths:
+        if not file_path:
+            continue
+        try:
+            os.unlink(file_path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error deleting file {file_path}: {e}")
     
-    markdown_content = f"""# Transcript: {original_filename}
-Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+    user_temp_dir = os.path.join(current_app.config['TEMP_DIR'], user_session)
+    try:
+        os.rmdir(user_temp_dir)
+    except OSError:
+        # Missing, or still holds other jobs' files and uploads
+        pass
+
+def get_async_openai_client(client=None):
+    """Return the AsyncOpenAI client of the running event loop, creating it on first use.
+
+    It is shared by every coroutine on the loop and lives as long as the
+    loop does. A new one reuses the credentials of an existing client if
+    given. As with get_openai_client, clients inherited from a parent
+    process are replaced.
+    """
+    global _async_openai_clients_pid
+    if _async_openai_clients_pid != os.getpid():
+        _async_openai_clients.clear()
+        _async_openai_clients_pid = os.getpid()
+    loop = asyncio.get_running_loop()
+    async_client = _async_openai_clients.get(loop)
+    if async_client is None:
+        if client is not None:
+            async_client = AsyncOpenAI(api_key=client.api_key, base_url=client.base_url,
+                                       http_client=openai_async_http_client(**openai_pool_options()))
+        else:
+            api_key = current_app.config['OPENAI_API_KEY']
+            if not api_key:
+                raise ValueError("OpenAI API key not found in configuration")
+            async_client = AsyncOpenAI(api_key=api_key, http_client=openai_async_http_client(**openai_pool_options()))
+        _async_openai_clients[loop] = async_client
+    return async_client
 
-## English Content
+def run_async(coroutine):
+    """Run a coroutine to completion on this thread's event loop.
 
-{transcript}
-"""
+    The loop stays open between calls, so the AsyncOpenAI client it holds
+    keeps its connections.
+    """
+    loop = getattr(_event_loops, 'loop', None)
+    if loop is None or loop.is_closed() or _event_loops.pid != os.getpid():
+        loop = asyncio.new_event_loop()
+        _event_loops.loop, _event_loops.pid = loop, os.getpid()
+    asyncio.set_event_loop(loop)
+    return loop.run_until_complete(coroutine)
 
-    if chinese_transcript:
-        markdown_content += f"""
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide limiter for chat completion requests"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter(
+            current_app.config['OPENAI_REQUESTS_PER_MINUTE'],
+            current_app.config['OPENAI_TOKENS_PER_MINUTE']
+        )
+    return _rate_limiter
 
-## Chinese Content / 中文内容
+def estimate_request_tokens(messages: List[dict]) -> int:
+    """Rough token cost of a chat request, assuming the reply is as long as the prompt"""
+    prompt_chars = sum(len(message['content']) for message in messages)
+    return 2 * (prompt_chars // CHARS_PER_TOKEN + 1)
 
-{chinese_transcript}
-"""
+async def create_chat_completion_async(client, messages: List[dict], semaphore: Semaphore) -> str:
+    """Run a gpt-4o chat completion within the concurrency and rate limits"""
+    limiter = get_rate_limiter()
+    estimated_tokens = estimate_request_tokens(messages)
     
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(markdown_content)
+    async with semaphore:
+        await limiter.acquire(estimated_tokens)
+        with span('openai.chat', {'gen_ai.request.model': "gpt-4o"}):
+            response = await client.chat.completions.create(
+                model="gpt-4o",
+                messages=messages,
+                temperature=0.3
+            )
     
-    return file_path
-
-def cleanup_user_files(user_session):
-    """Clean up all temporary files for a user session"""
-    if not user_session:
-        return
-        
-    user_temp_dir = os.path.join(current_app.config['TEMP_DIR'], user_session)
-    try:
-        if os.path.exists(user_temp_dir):
-            for filename in os.listdir(user_temp_dir):
-                file_path = os.path.join(user_temp_dir, filename)
-                try:
-                    os.unlink(file_path)
-                except Exception as e:
-                    print(f"Error deleting file {file_path}: {e}")
-            os.rmdir(user_temp_dir)
-    except Exception as e:
-        print(f"Error cleaning up user directory: {e}") 
+    if response.usage:
+        limiter.settle(estimated_tokens, response.usage.total_tokens)
+        record_llm_tokens("gpt-4o", response.usage.prompt_tokens, response.usage.completion_tokens)
+    return response.choices[0].message.content
 
-async def process_chunk_async(client, chunk: str, chunk_num: int) -> tuple[int, str]:
+async def process_chunk_async(client, chunk: str, chunk_num: int, semaphore: Semaphore) -> tuple[int, str]:
     """Process a single chunk asynchronously"""
     try:
         print(f"Processing chunk {chunk_num}")
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+        content = await create_chat_completion_async(
+            client,
+            [
                 {"role": "system", "content": """You are a transcript editor. Your task is to:
 1. Format the text into proper paragraphs
 2. Add appropriate punctuation
@@ -150,19 +332,21 @@ async def process_chunk_async(client, chunk: str, chunk_num: int) -> tuple[int,
 Do not add any commentary or change the meaning of the text."""},
                 {"role": "user", "content": f"Please format this transcript chunk:\n\n{chunk}"}
             ],
-            temperature=0.3
+            semaphore
         )
-        return chunk_num, response.choices[0].message.content
+        return chunk_num, content
     except Exception as e:
         print(f"Error processing chunk {chunk_num}: {e}")
         return chunk_num, chunk  # Return original chunk if processing fails
 
 async def process_chunks_concurrently(client, chunks: List[str]) -> List[str]:
     """Process multiple chunks concurrently"""
-    tasks = []
-    for i, chunk in enumerate(chunks):
-        task = process_chunk_async(client, chunk, i)
-        tasks.append(task)
+    semaphore = Semaphore(MAX_CONCURRENT_REQUESTS)
+    async_client = get_async_openai_client(client)
+    tasks = [
+        process_chunk_async(async_client, chunk, i, semaphore)
+        for i, chunk in enumerate(chunks)
+    ]
     
     # Wait for all chunks to be processed
     results = await asyncio.gather(*tasks)
@@ -174,24 +358,11 @@ async def process_chunks_concurrently(client, chunks: List[str]) -> List[str]:
 def process_text_with_gpt4(client, text: str) -> str:
     """Process text with GPT-4 to improve formatting and readability"""
     try:
-        # Split text into chunks of approximately 2000 words
-        words = text.split()
-        chunks = []
-        chunk_size = 2000
-        
-        for i in range(0, len(words), chunk_size):
-            chunk = ' '.join(words[i:i + chunk_size])
-            chunks.append(chunk)
-        
+        chunks = chunk_text(text, current_app.config['FORMAT_CHUNK_TOKENS'])
         print(f"Split text into {len(chunks)} chunks")
         
         # Process chunks concurrently
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        processed_chunks = loop.run_until_complete(
-            process_chunks_concurrently(client, chunks)
-        )
-        loop.close()
+        processed_chunks = run_async(process_chunks_concurrently(client, chunks))
         
         # Combine processed chunks with section breaks
         return "\n\n---\n\n".join(processed_chunks)
@@ -202,92 +373,50 @@ def process_text_with_gpt4(client, text: str) -> str:
 
 async def translate_chunk_async(client, chunk: str, chunk_num: int, semaphore: Semaphore) -> tuple[int, str]:
     """Translate a single chunk to Chinese asynchronously"""
-    async with semaphore:  # Limit concurrent API calls
-        try:
-            print(f"Translating chunk {chunk_num}")
-            start_time = time.time()
-            
-            # Use regular create method in an async context
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": """You are a professional translator. 
+    try:
+        print(f"Translating chunk {chunk_num}")
+        start_time = time.time()
+        
+        content = await create_chat_completion_async(
+            client,
+            [
+                {"role": "system", "content": """You are a professional translator. 
 Translate English to Chinese while:
 1. Maintaining the original meaning accurately
 2. Using natural and fluent Chinese expressions
 3. Preserving any markdown formatting
 4. Keeping section headings in both English and Chinese"""},
-                    {"role": "user", "content": f"Translate to Chinese:\n\n{chunk}"}
-                ],
-                temperature=0.3
-            )
-            
-            duration = time.time() - start_time
-            print(f"Chunk {chunk_num} translated in {duration:.2f}s")
-            return chunk_num, response.choices[0].message.content
-            
-        except Exception as e:
-            print(f"Error translating chunk {chunk_num}: {e}")
-            return chunk_num, chunk
-
-def split_into_sentence_chunks(text: str, max_chunk_size: int = TRANSLATION_CHUNK_SIZE) -> List[str]:
-    """Split text into chunks at sentence boundaries"""
-    sentences = text.split('.')
-    chunks = []
-    current_chunk = []
-    current_size = 0
-    
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-            
-        sentence = sentence + '.'
-        sentence_size = len(sentence.split())
+                {"role": "user", "content": f"Translate to Chinese:\n\n{chunk}"}
+            ],
+            semaphore
+        )
         
-        if current_size + sentence_size > max_chunk_size and current_chunk:
-            chunks.append(' '.join(current_chunk))
-            current_chunk = [sentence]
-            current_size = sentence_size
-        else:
-            current_chunk.append(sentence)
-            current_size += sentence_size
-    
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
-    
-    return chunks
+        duration = time.time() - start_time
+        print(f"Chunk {chunk_num} translated in {duration:.2f}s")
+        return chunk_num, content
+        
+    except Exception as e:
+        print(f"Error translating chunk {chunk_num}: {e}")
+        return chunk_num, chunk
 
 async def translate_text_concurrently(client, text: str) -> str:
     """Translate text to Chinese with concurrent processing"""
     try:
-        # Split into smaller chunks at sentence boundaries
-        chunks = split_into_sentence_chunks(text)
+        chunks = chunk_text(text, current_app.config['TRANSLATION_CHUNK_TOKENS'])
         total_chunks = len(chunks)
         print(f"Split text into {total_chunks} chunks for translation")
         
-        # Create semaphore for rate limiting
+        # In-flight cap; request and token budgets are enforced by the rate limiter
         semaphore = Semaphore(MAX_CONCURRENT_REQUESTS)
         
-        # Process chunks concurrently with rate limiting
         start_time = time.time()
         
-        # Create and gather tasks in smaller batches
-        all_results = []
-        batch_size = MAX_CONCURRENT_REQUESTS
-        
-        for i in range(0, total_chunks, batch_size):
-            batch_chunks = chunks[i:i + batch_size]
-            tasks = [
-                translate_chunk_async(client, chunk, j + i, semaphore)
-                for j, chunk in enumerate(batch_chunks)
-            ]
-            batch_results = await asyncio.gather(*tasks)
-            all_results.extend(batch_results)
-            
-            # Add a small delay between batches to avoid rate limits
-            if i + batch_size < total_chunks:
-                await asyncio.sleep(1)
+        async_client = get_async_openai_client(client)
+        tasks = [
+            translate_chunk_async(async_client, chunk, i, semaphore)
+            for i, chunk in enumerate(chunks)
+        ]
+        all_results = await asyncio.gather(*tasks)
         
         # Sort results by chunk number and extract translated text
         sorted_results = sorted(all_results, key=lambda x: x[0])
@@ -304,29 +433,5 @@ async def translate_text_concurrently(client, text: str) -> str:
         return text
 
 def save_bilingual_transcript(original_filename: str, en_transcript: str, zh_transcript: str) -> str:
-    """Save both English and Chinese transcripts to a markdown file"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    base_name = os.path.splitext(original_filename)[0]
-    safe_name = secure_filename(f"{base_name}_bilingual_{timestamp}.md")
-    file_path = os.path.join(current_app.config['TRANSCRIPTS_DIR'], safe_name)
-    
-    markdown_content = f"""# Bilingual Transcript: {original_filename}
-
-## Metadata
-- **Source File:** {original_filename}
-- **Generated:** {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-- **Duration:** [Duration will be added here]
-
-## English Content
-
-{en_transcript}
-
-## Chinese Content / 中文内容
-
-{zh_transcript}
-"""
-    
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(markdown_content)
-    
-    return file_path
\ No newline at end of file
+    """Save both English and Chinese transcripts, returning the markdown path"""
+    return create_transcript(original_filename, en_transcript, chinese=zh_transcript, suffix='_bilingual')
@@ -0,0 +1,122 @@
+"""Compare the token-aware chunker with the word-count splitters it replaced.
+
+Usage: python -m benchmarks.chunking [transcript.md ...]
+
+Without arguments a set of synthetic English, Chinese and bilingual
+transcripts is used. For /translate and /process the table shows how many
+requests each splitter makes, how full the chunks are, and how many exceed
+the token budget. The batched row shows the requests left once chunks
+share requests, and their size against the batch budget.
+"""
+import time
+import random
+import argparse
+from config import Config
+from app.catalog import split_sections
+from app.chunking import chunk_text, count_tokens, get_encoding, plan_batches
+
+ENGLISH_SENTENCES = [
+    "Today we look at gradient descent, which updates the weights by 0.01 times the gradient.",
+    "Dr. Lee showed in Fig. 3 that the loss drops quickly, e.g. within the first 2.5 epochs.",
+    "You can find the notebook at https://example.com/course/week3.ipynb after class.",
+    "Why does this work?",
+    "Because the learning rate is small enough, the updates never overshoot the minimum.",
+    "We will come back to momentum, Adam and friends in the next lecture.",
+]
+CHINESE_SENTENCES = [
+    "今天我们来看梯度下降，它每次按照梯度的零点零一倍来更新权重。",
+    "李博士在图三中展示了损失下降得很快，比如在前两个半轮之内。",
+    "为什么这样可行？",
+    "因为学习率足够小，所以每次更新都不会越过最小值。",
+    "下一节课我们会继续讨论动量和Adam等方法。",
+]
+
+def legacy_split(text: str, max_chunk_size: int):
+    """The previous splitter: split on '.', size by whitespace-separated words"""
+    chunks = []
+    current_chunk = []
+    current_size = 0
+    for sentence in text.split('.'):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        sentence = sentence + '.'
+        sentence_size = len(sentence.split())
+        if current_size + sentence_size > max_chunk_size and current_chunk:
+            chunks.append(' '.join(current_chunk))
+            current_chunk = [sentence]
+            current_size = sentence_size
+        else:
+            current_chunk.append(sentence)
+            current_size += sentence_size
+    if current_chunk:
+        chunks.append(' '.join(current_chunk))
+    return chunks
+
+def synthetic_transcripts(rng: random.Random):
+    def paragraphs(sentences, count, joiner):
+        return '\n\n'.join(joiner.join(rng.choice(sentences) for _ in range(8)) for _ in range(count))
+    english = paragraphs(ENGLISH_SENTENCES, 120, ' ')
+    chinese = paragraphs(CHINESE_SENTENCES, 120, '')
+    return {
+        'english lecture': english,
+        'chinese lecture': chinese,
+        'bilingual lecture': english[:len(english) // 2] + '\n\n' + chinese[:len(chinese) // 2],
+    }
+
+def load_transcripts(paths):
+    transcripts = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            english, chinese = split_sections(f.read())
+        transcripts[path] = (english + '\n\n' + chinese).strip()
+    return transcripts
+
+def describe(name: str, chunks, budget: int, wall: float):
+    tokens = [count_tokens(chunk) for chunk in chunks] or [0]
+    over = sum(1 for t in tokens if t > budget)
+    fill = sum(tokens) / (len(chunks) * budget) if chunks else 0
+    print(f"  {name:<10} {len(chunks):>8} {sum(tokens) / len(tokens):>11.0f} {max(tokens):>10} "
+          f"{fill:>7.0%} {over:>11} {wall * 1000:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('transcripts', nargs='*', help='markdown transcripts to chunk')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    transcripts = load_transcripts(args.transcripts) if args.transcripts else synthetic_transcripts(random.Random(args.seed))
+    print(f"Counting tokens with {'tiktoken ' + Config.TOKENIZER_ENCODING if get_encoding() else 'the estimate'}")
+    # Word budgets of the old splitters next to the token budgets replacing them
+    stages = [
+        ('translate', 300, Config.TRANSLATION_CHUNK_TOKENS, Config.TRANSLATION_BATCH_TOKENS),
+        ('process', 500, Config.FORMAT_CHUNK_TOKENS, Config.FORMAT_BATCH_TOKENS),
+    ]
+    totals = {'legacy': 0, 'tokens': 0, 'batched': 0}
+    for name, text in transcripts.items():
+        print(f"\n{name}: {count_tokens(text)} tokens")
+        for stage, words, budget, batch_budget in stages:
+            print(f" {stage} (budget {budget} tokens)")
+            print(f"  {'splitter':<10} {'requests':>8} {'mean tokens':>11} {'max tokens':>10} "
+                  f"{'fill':>7} {'over budget':>11} {'time (ms)':>9}")
+            start = time.perf_counter()
+            chunks = legacy_split(text, words)
+            describe('legacy', chunks, budget, time.perf_counter() - start)
+            totals['legacy'] += len(chunks)
+
+            start = time.perf_counter()
+            chunks = chunk_text(text, budget)
+            describe('tokens', chunks, budget, time.perf_counter() - start)
+            totals['tokens'] += len(chunks)
+
+            start = time.perf_counter()
+            batches = plan_batches([count_tokens(chunk) for chunk in chunks], batch_budget, Config.LLM_BATCH_MIN_PARALLEL)
+            requests = ['\n\n'.join(chunks[i] for i in batch) for batch in batches]
+            describe('batched', requests, batch_budget, time.perf_counter() - start)
+            totals['batched'] += len(requests)
+
+    print(f"\nTotal requests: legacy {totals['legacy']}, token-aware {totals['tokens']}, "
+          f"batched {totals['batched']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""Run /transcribe, /process and /translate end to end against a local OpenAI stub.
+
+Usage: python -m benchmarks.end_to_end --minutes 10 60 --formats mp3 wav mp4 --output results.json
+
+Synthetic speech-like audio of each length and format is generated with
+ffmpeg and kept in --audio-dir between runs. Celery tasks run eagerly in
+this process, so only Redis has to be running. Storage and caches go to a
+temporary directory, so every run starts cold. The stub runs in its own
+process with the given latency, jitter and share of 429 replies, and its
+Whisper replies hold ~150 words per minute of audio.
+
+For each stage the JSON report holds the wall time, the time until the
+first text reached the job's event streams, peak RSS of this process and
+of the largest ffmpeg so far, CPU seconds of both, and the requests the
+stub answered, including injected 429s. Compare reports across versions
+to spot regressions.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+import urllib.request
+from datetime import datetime
+from config import Config
+from benchmarks.openai_stub import OpenAIStub
+
+WORDS_PER_MINUTE = 150
+SAMPLE_SECONDS = 60  # Longer files loop this clip
+# Voiced syllables at ~4 per second with a falling pitch, and a pause every 6.5s
+SPEECH_EXPRESSION = (
+    "0.3*(sin(2*PI*(140-20*mod(t,6.5)/6.5)*t)+0.5*sin(4*PI*(140-20*mod(t,6.5)/6.5)*t))"
+    "*pow(sin(PI*4*t),2)*gt(mod(t,6.5),1.2)"
+)
+FORMAT_ARGS = {
+    'mp3': ['-c:a', 'libmp3lame', '-b:a', '64k'],
+    'wav': ['-ar', '16000', '-ac', '1', '-c:a', 'pcm_s16le'],
+    'mp4': ['-c:v', 'mpeg4', '-c:a', 'aac', '-b:a', '96k'],
+}
+
+def ffmpeg(*args):
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', *args], check=True)
+
+def make_audio(audio_dir: str, minutes: float, fmt: str) -> str:
+    """Speech-like audio of the given length, generated once per length and format"""
+    sample = os.path.join(audio_dir, 'speech_sample.wav')
+    if not os.path.exists(sample):
+        ffmpeg('-f', 'lavfi', '-i', f"aevalsrc='{SPEECH_EXPRESSION}':s=16000:d={SAMPLE_SECONDS}",
+               '-f', 'lavfi', '-i', f"anoisesrc=c=pink:a=0.02:r=16000:d={SAMPLE_SECONDS}",
+               '-filter_complex', 'amix=inputs=2:normalize=0', sample)
+
+    path = os.path.join(audio_dir, f"speech_{minutes:g}min.{fmt}")
+    if not os.path.exists(path):
+        video = ['-f', 'lavfi', '-i', 'color=c=black:s=64x64:r=1'] if fmt == 'mp4' else []
+        ffmpeg('-stream_loop', '-1', '-i', sample, *video, '-t', str(minutes * 60), *FORMAT_ARGS[fmt], path)
+    return path
+
+def serve_stub(urls, options: dict):
+    stub = OpenAIStub(**options).start()
+    urls.put((stub.base_url, stub.stats_url))
+    threading.Event().wait()
+
+def fetch_stats(stats_url: str) -> dict:
+    with urllib.request.urlopen(stats_url) as response:
+        return json.load(response)
+
+def counts_since(before: dict, after: dict) -> dict:
+    return {path: count - before.get(path, 0) for path, count in after.items() if count - before.get(path, 0)}
+
+class FirstText:
+    """Note when the first streamed text of any job is published"""
+
+    def __init__(self):
+        from app.events import get_events_redis, delta_channel
+        self.time = None
+        self._stop = threading.Event()
+        self._pubsub = get_events_redis().pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(delta_channel('*'))
+        self._thread = threading.Thread(target=self._listen, daemon=True)
+        self._thread.start()
+
+    def _listen(self):
+        while not self._stop.is_set():
+            if self._pubsub.get_message(timeout=0.05) and self.time is None:
+                self.time = time.time()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._pubsub.close()
+
+def first_chunk_time(job_id: str):
+    from app.events import get_events_redis, event_history_key
+    for payload in get_events_redis().lrange(event_history_key(job_id), 0, -1):
+        event = json.loads(payload)
+        if event['type'] == 'chunk':
+            return event['time']
+    return None
+
+def wait_for(client, status_url: str) -> dict:
+    while True:
+        result = client.get(status_url).get_json()
+        if result.get('status') != 'processing':
+            return result
+        time.sleep(0.1)
+
+def measure(stats_url: str, run) -> tuple:
+    """Run one stage, returning its measurements and result"""
+    from app.metrics import peak_rss_bytes, reset_peak_rss
+    requests_before = fetch_stats(stats_url)
+    reset_peak_rss()
+    first_text = FirstText()
+    times_before = os.times()
+    started_at = time.time()
+    start = time.perf_counter()
+
+    job_id, result = run()
+
+    wall = time.perf_counter() - start
+    times_after = os.times()
+    first_text.close()
+    requests_after = fetch_stats(stats_url)
+    first = [t for t in (first_text.time, first_chunk_time(job_id)) if t is not None]
+    stats = {
+        'wall_seconds': round(wall, 3),
+        'first_text_seconds': round(min(first) - started_at, 3) if first else None,
+        'peak_rss_bytes': peak_rss_bytes(),
+        'ffmpeg_peak_rss_bytes': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024,
+        'cpu_seconds': round(times_after.user - times_before.user + times_after.system - times_before.system, 3),
+        'ffmpeg_cpu_seconds': round(times_after.children_user - times_before.children_user
+                                    + times_after.children_system - times_before.children_system, 3),
+        'requests': counts_since(requests_before['requests'], requests_after['requests']),
+        'rate_limited': counts_since(requests_before['rejected'], requests_after['rejected']),
+    }
+    if result.get('status') == 'error' or 'error' in result:
+        stats['error'] = result.get('error') or result.get('message') or 'failed'
+    return stats, result
+
+def run_pipeline(client, stats_url: str, audio_path: str) -> dict:
+    def transcribe():
+        with open(audio_path, 'rb') as f:
+            response = client.post('/transcribe', data={'file': (f, os.path.basename(audio_path))},
+                                   content_type='multipart/form-data')
+        task_id = response.get_json()['task_id']
+        return task_id, wait_for(client, f"/task/{task_id}")
+
+    stages = {}
+    stages['transcribe'], transcription = measure(stats_url, transcribe)
+    if 'error' in stages['transcribe']:
+        return stages
+
+    text, filename = transcription['transcription'], transcription['saved_to']
+    for stage, status_path in (('process', '/process/status'), ('translate', '/translate/status')):
+        def run():
+            task_id = client.post(f"/{stage}", json={'text': text, 'filename': filename}).get_json()['task_id']
+            return task_id, wait_for(client, f"{status_path}/{task_id}")
+        stages[stage], _ = measure(stats_url, run)
+    return stages
+
+def use_storage(storage_dir: str):
+    """Point every app instance, including the ones tasks create, at a fresh storage tree"""
+    Config.STORAGE_DIR = storage_dir
+    Config.TEMP_DIR = os.path.join(storage_dir, 'temp')
+    Config.TRANSCRIPTS_DIR = os.path.join(storage_dir, 'transcripts')
+    Config.TRANSCRIPT_RECORDS_DIR = os.path.join(storage_dir, 'records')
+    Config.CATALOG_PATH = os.path.join(storage_dir, 'catalog.sqlite3')
+    Config.CHUNKS_DIR = os.path.join(storage_dir, 'chunks')
+    Config.TRANSCRIPT_CACHE_DIR = os.path.join(storage_dir, 'cache', 'transcripts')
+    Config.LLM_CACHE_BACKEND = 'sqlite'
+    Config.LLM_CACHE_SQLITE_PATH = os.path.join(storage_dir, 'cache', 'llm.sqlite3')
+    Config.OPENAI_API_KEY = 'stub'
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', type=float, nargs='+', default=[10], help='audio lengths, e.g. 10 60 240')
+    parser.add_argument('--formats', nargs='+', choices=sorted(FORMAT_ARGS), default=['mp3', 'wav', 'mp4'])
+    parser.add_argument('--delay', type=float, default=0.5, help='stub latency per request in seconds')
+    parser.add_argument('--jitter', type=float, default=0.2, help='extra random latency of up to this many seconds')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='share of requests answered with 429')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--audio-dir', default=os.path.join(tempfile.gettempdir(), 'transcriber-bench-audio'))
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    os.makedirs(args.audio_dir, exist_ok=True)
+    runs = [(minutes, fmt) for minutes in args.minutes for fmt in args.formats]
+    print(f"Generating audio in {args.audio_dir}")
+    audio = {run: make_audio(args.audio_dir, *run) for run in runs}
+
+    urls = multiprocessing.Queue()
+    stub = multiprocessing.Process(target=serve_stub, args=(urls, {
+        'delay': args.delay, 'jitter': args.jitter, 'rate_limit': args.rate_limit,
+        'words_per_minute': WORDS_PER_MINUTE, 'seed': args.seed,
+    }), daemon=True)
+    stub.start()
+    base_url, stats_url = urls.get(timeout=30)
+    os.environ['OPENAI_BASE_URL'] = base_url
+
+    report = {
+        'revision': git_revision(),
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'settings': vars(args),
+        'runs': [],
+    }
+    try:
+        with tempfile.TemporaryDirectory() as storage_dir:
+            use_storage(storage_dir)
+            from app import create_app
+            from app.celery_app import celery
+            celery.conf.task_always_eager = True
+            # Status routes read results from the backend, as they would from a worker
+            celery.conf.task_store_eager_result = True
+            app = create_app()
+
+            print(f"{'audio':<18} {'stage':<10} {'wall (s)':>9} {'first text (s)':>14} {'peak RSS (MB)':>13} "
+                  f"{'CPU (s)':>8} {'requests':>8} {'429s':>5}")
+            for minutes, fmt in runs:
+                with app.test_client() as client:
+                    stages = run_pipeline(client, stats_url, audio[(minutes, fmt)])
+                report['runs'].append({'minutes': minutes, 'format': fmt, 'stages': stages})
+                for stage, stats in stages.items():
+                    first_text = stats['first_text_seconds']
+                    print(f"{f'{minutes:g} min {fmt}':<18} {stage:<10} {stats['wall_seconds']:>9.2f} "
+                          f"{first_text if first_text is not None else '-':>14} "
+                          f"{stats['peak_rss_bytes'] / (1024 * 1024):>13.0f} "
+                          f"{stats['cpu_seconds'] + stats['ffmpeg_cpu_seconds']:>8.2f} "
+                          f"{sum(stats['requests'].values()):>8} {sum(stats['rate_limited'].values()):>5}"
+                          + (f"  error: {stats['error']}" if 'error' in stats else ''))
+    finally:
+        stub.terminate()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
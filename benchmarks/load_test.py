@@ -0,0 +1,255 @@
+"""Load-test the web tier with many concurrent simulated users.
+
+Usage: python -m benchmarks.load_test --transcripts 5000 --users 200 --duration 60
+
+The app is started under hypercorn, as run.py serves it, on a storage
+directory holding --transcripts synthetic transcripts (or an existing one
+from benchmarks.transcript_fixtures with --storage-dir). Pass --url
+instead to load a server that is already running.
+
+As in production, the app needs Redis for progress events and partial
+results. Celery runs in one of two modes:
+- stub (the default): tasks are queued on an in-memory broker that no
+  worker reads. Uploads return at once and status polls keep answering
+  "processing", which isolates the web tier.
+- eager: tasks run inside the request against a local OpenAI stub.
+
+Each user repeatedly picks a scenario by weight:
+- list: a page of /transcripts
+- get: one /transcripts/<filename>, revalidated with its ETag as a
+  browser would
+- poll: the status loop of index.html, i.e. /task/<id> and
+  /task/<id>/chunks every --poll-interval
+- upload: a short clip POSTed to /transcribe
+
+Latency percentiles and throughput are reported per route, optionally as
+JSON.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+import urllib.request
+from collections import defaultdict
+import aiohttp
+from benchmarks.end_to_end import make_audio, use_storage
+from benchmarks.openai_stub import OpenAIStub
+from benchmarks.transcript_fixtures import make_fixtures
+
+SCENARIOS = ('list', 'get', 'poll', 'upload')
+DEFAULT_WEIGHTS = {'list': 3, 'get': 5, 'poll': 10, 'upload': 1}
+POLLS_PER_SCENARIO = 10
+UPLOAD_MINUTES = 0.5
+
+def serve(storage_dir: str, port: int, celery_mode: str):
+    """Run the app under hypercorn like run.py, with Celery in the given mode"""
+    from hypercorn.config import Config as HypercornConfig
+    from hypercorn.asyncio import serve as hypercorn_serve
+    from hypercorn.middleware import AsyncioWSGIMiddleware
+    use_storage(storage_dir)
+    from app import create_app
+    from app.celery_app import celery
+    from app.events import EventStreamMiddleware
+    if celery_mode == 'eager':
+        stub = OpenAIStub(delay=0.2, words_per_minute=150).start()
+        os.environ['OPENAI_BASE_URL'] = stub.base_url
+        celery.conf.task_always_eager = True
+        celery.conf.task_store_eager_result = True
+    else:
+        celery.conf.broker_url = 'memory://'
+        celery.conf.result_backend = 'cache+memory://'
+
+    app = create_app()
+    config = HypercornConfig()
+    config.bind = [f"127.0.0.1:{port}"]
+    config.accesslog = None
+    asgi_app = EventStreamMiddleware(AsyncioWSGIMiddleware(app, config.wsgi_max_body_size))
+    asyncio.run(hypercorn_serve(asgi_app, config))
+
+def wait_until_up(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+def percentile(ordered: list, p: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+class LoadTest:
+    def __init__(self, base_url: str, filenames: list, audio_path: str, weights: dict, poll_interval: float,
+                 think_time: float, seed: int):
+        self.base_url = base_url.rstrip('/')
+        self.filenames = filenames
+        self.audio_path = audio_path
+        self.weights = weights
+        self.poll_interval = poll_interval
+        self.think_time = think_time
+        self.rng = random.Random(seed)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    async def request(self, session, route: str, method: str, path: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            async with session.request(method, self.base_url + path, **kwargs) as response:
+                body = await response.read()
+                status = response.status
+                headers = response.headers
+        except aiohttp.ClientError as e:
+            self.errors[route] += 1
+            self.statuses[route][type(e).__name__] += 1
+            return None, None, None
+        self.latencies[route].append(time.perf_counter() - start)
+        self.statuses[route][status] += 1
+        if status >= 400:
+            self.errors[route] += 1
+        return status, headers, body
+
+    async def list_transcripts(self, session, state: dict):
+        pages = max(1, len(self.filenames) // 50)
+        await self.request(session, '/transcripts', 'GET', f"/transcripts?page={self.rng.randint(1, pages)}")
+
+    async def get_transcript(self, session, state: dict):
+        filename = self.rng.choice(self.filenames)
+        etag = state['etags'].get(filename)
+        headers = {'If-None-Match': etag} if etag else {}
+        status, response_headers, _ = await self.request(session, '/transcripts/<filename>', 'GET',
+                                                         f"/transcripts/{filename}", headers=headers)
+        if status == 200 and 'ETag' in response_headers:
+            state['etags'][filename] = response_headers['ETag']
+
+    async def poll_task(self, session, state: dict):
+        task_id = state['task_id'] or str(uuid.uuid4())
+        for _ in range(POLLS_PER_SCENARIO):
+            await self.request(session, '/task/<task_id>', 'GET', f"/task/{task_id}")
+            await self.request(session, '/task/<task_id>/chunks', 'GET', f"/task/{task_id}/chunks?start=0")
+            await asyncio.sleep(self.poll_interval)
+
+    async def upload(self, session, state: dict):
+        form = aiohttp.FormData()
+        with open(self.audio_path, 'rb') as f:
+            form.add_field('file', f.read(), filename=os.path.basename(self.audio_path))
+        status, _, body = await self.request(session, '/transcribe', 'POST', '/transcribe', data=form)
+        if status == 200:
+            state['task_id'] = json.loads(body).get('task_id')
+
+    async def user(self, deadline: float):
+        scenarios = {
+            'list': self.list_transcripts,
+            'get': self.get_transcript,
+            'poll': self.poll_task,
+            'upload': self.upload,
+        }
+        names = [name for name in SCENARIOS if self.weights.get(name)]
+        weights = [self.weights[name] for name in names]
+        state = {'etags': {}, 'task_id': None}
+        # Each user has its own cookies, so uploads land in their own session
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300),
+                                         cookie_jar=aiohttp.CookieJar(unsafe=True)) as session:
+            while time.monotonic() < deadline:
+                await scenarios[self.rng.choices(names, weights)[0]](session, state)
+                if self.think_time:
+                    await asyncio.sleep(self.rng.uniform(0, 2 * self.think_time))
+
+    async def run(self, users: int, duration: float, ramp_up: float) -> float:
+        deadline = time.monotonic() + duration
+        start = time.perf_counter()
+
+        async def delayed_user(i: int):
+            await asyncio.sleep(ramp_up * i / users)
+            await self.user(deadline)
+
+        await asyncio.gather(*(delayed_user(i) for i in range(users)))
+        return time.perf_counter() - start
+
+    def report(self, wall: float) -> dict:
+        routes = {}
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            ordered = sorted(self.latencies[route])
+            routes[route] = {
+                'requests': len(ordered),
+                'errors': self.errors[route],
+                'statuses': {str(status): count for status, count in self.statuses[route].items()},
+                'throughput_per_second': round(len(ordered) / wall, 2),
+                'p50_ms': round(percentile(ordered, 50) * 1000, 1) if ordered else None,
+                'p95_ms': round(percentile(ordered, 95) * 1000, 1) if ordered else None,
+                'p99_ms': round(percentile(ordered, 99) * 1000, 1) if ordered else None,
+                'max_ms': round(ordered[-1] * 1000, 1) if ordered else None,
+            }
+        return routes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='load a running server instead of starting one')
+    parser.add_argument('--storage-dir', help='existing storage with transcripts from benchmarks.transcript_fixtures')
+    parser.add_argument('--transcripts', type=int, default=5000, help='transcripts generated without --storage-dir')
+    parser.add_argument('--celery', choices=('stub', 'eager'), default='stub')
+    parser.add_argument('--port', type=int, default=5051)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=60, help='seconds of load')
+    parser.add_argument('--ramp-up', type=float, default=10, help='seconds over which users start')
+    parser.add_argument('--think-time', type=float, default=0.5, help='mean pause between scenarios in seconds')
+    parser.add_argument('--poll-interval', type=float, default=0.5, help='pause between status polls in seconds')
+    for name in SCENARIOS:
+        parser.add_argument(f"--{name}-weight", type=float, default=DEFAULT_WEIGHTS[name])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    args = parser.parse_args()
+
+    temp_dir = tempfile.TemporaryDirectory()
+    storage_dir = args.storage_dir
+    if storage_dir is None and args.url is None:
+        storage_dir = os.path.join(temp_dir.name, 'storage')
+        print(f"Generating {args.transcripts} transcripts")
+        make_fixtures(storage_dir, args.transcripts, seed=args.seed)
+    audio_path = make_audio(temp_dir.name, UPLOAD_MINUTES, 'mp3')
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server = multiprocessing.Process(target=serve, args=(storage_dir, args.port, args.celery), daemon=True)
+        server.start()
+        base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_until_up(base_url + '/')
+        # Filenames come from the server, so --url works against any archive
+        with urllib.request.urlopen(f"{base_url}/transcripts?per_page=500") as response:
+            filenames = [transcript['filename'] for transcript in json.load(response)]
+        if not filenames:
+            raise SystemExit('The server has no transcripts to load')
+
+        weights = {name: getattr(args, f"{name}_weight") for name in SCENARIOS}
+        test = LoadTest(base_url, filenames, audio_path, weights, args.poll_interval, args.think_time, args.seed)
+        print(f"Running {args.users} users for {args.duration:g}s against {base_url} (celery: {args.celery})")
+        wall = asyncio.run(test.run(args.users, args.duration, args.ramp_up))
+        routes = test.report(wall)
+    finally:
+        if server is not None:
+            server.terminate()
+        temp_dir.cleanup()
+
+    print(f"{'route':<24} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} "
+          f"{'p99 (ms)':>9} {'max (ms)':>9}")
+    for route, stats in routes.items():
+        print(f"{route:<24} {stats['requests']:>8} {stats['errors']:>6} {stats['throughput_per_second']:>8.1f} "
+              + ' '.join(f"{stats[key] if stats[key] is not None else '-':>9}"
+                         for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms')))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'settings': vars(args), 'wall_seconds': round(wall, 2), 'routes': routes}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""Local stand-in for the OpenAI HTTP API used by the benchmarks"""
+import os
+import json
+import time
+import random
+import tempfile
+import threading
+from collections import Counter
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.audio import probe_audio
+
+RATE_LIMIT_RETRY_MS = 100  # Sent as retry-after-ms with every injected 429
+SPEECH_WORDS = (
+    "the model we learn gradient loss data training step so now if you look at this example "
+    "here weights update rate small large error function because then we can see that it "
+    "works in practice and next time we will talk about why it matters for the course"
+).split()
+
+def audio_duration(content_type: str, body: bytes) -> float:
+    """Duration of the audio file in a multipart Whisper upload"""
+    message = BytesParser(policy=policy.default).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    for part in message.iter_parts():
+        if part.get_param('name', header='content-disposition') != 'file':
+            continue
+        suffix = os.path.splitext(part.get_filename() or '')[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix) as f:
+            f.write(part.get_payload(decode=True))
+            f.flush()
+            return probe_audio(f.name)['duration']
+    return 0.0
+
+class OpenAIStub:
+    """Serve fake Whisper and chat completion responses after a per-request delay.
+
+    Each delay is the base delay plus up to jitter seconds, and a rate_limit
+    fraction of requests is answered with 429 instead. Streamed chat
+    completions spread the delay over their pieces of text. With
+    words_per_minute, Whisper replies hold speech-like text as long as the
+    uploaded audio, so later stages get realistic amounts of text.
+    """
+
+    def __init__(self, delay: float = 0.5, host: str = '127.0.0.1', port: int = 0, jitter: float = 0.0,
+                 rate_limit: float = 0.0, words_per_minute: int = None, seed: int = 0):
+        self.delay = delay
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.words_per_minute = words_per_minute
+        self.requests = Counter()
+        self.rejected = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def stats_url(self) -> str:
+        """Request and 429 counts by path, for a stub running in another process"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/stats"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                # Drain the upload so the client sees a normal request cycle
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length)
+
+                with stub._lock:
+                    stub.requests[self.path] += 1
+                    rejected = stub._random.random() < stub.rate_limit
+                    latency = stub.delay + stub._random.uniform(0, stub.jitter)
+                    if rejected:
+                        stub.rejected[self.path] += 1
+                if rejected:
+                    self._reply(429, 'application/json',
+                                '{"error": {"message": "Rate limit reached", "code": "rate_limit_exceeded"}}',
+                                {'retry-after-ms': str(RATE_LIMIT_RETRY_MS)})
+                    return
+
+                if self.path.endswith('/audio/transcriptions'):
+                    time.sleep(latency)
+                    if stub.words_per_minute:
+                        duration = audio_duration(self.headers.get('Content-Type', ''), body)
+                        transcription = stub.speech_transcription(duration, stub.words_per_minute, length)
+                        text = transcription['text']
+                    else:
+                        text = f"stub transcript of {length} bytes"
+                        transcription = stub.verbose_transcription(text)
+                    if b'verbose_json' in body:
+                        self._reply(200, 'application/json', json.dumps(transcription))
+                    else:
+                        self._reply(200, 'text/plain', text + "\n")
+                elif self.path.endswith('/chat/completions'):
+                    request = json.loads(body)
+                    completion = stub.chat_completion(request)
+                    if request.get('stream'):
+                        self._stream(completion, latency)
+                    else:
+                        time.sleep(latency)
+                        self._reply(200, 'application/json', json.dumps(completion))
+                else:
+                    self._reply(404, 'application/json', '{"error": {"message": "not found"}}')
+
+            def do_GET(self):
+                if self.path == '/stats':
+                    with stub._lock:
+                        stats = {'requests': dict(stub.requests), 'rejected': dict(stub.rejected)}
+                    self._reply(200, 'application/json', json.dumps(stats))
+                else:
+                    self._reply(404, 'application/json', '{"error": {"message": "not found"}}')
+
+            def _reply(self, status: int, content_type: str, body: str, headers: dict = None):
+                payload = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, completion: dict, latency: float, piece_chars: int = 16):
+                content = completion['choices'][0]['message']['content']
+                pieces = [content[i:i + piece_chars] for i in range(0, len(content), piece_chars)] or ['']
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+
+                def send_event(data: str):
+                    payload = f"data: {data}\n\n".encode('utf-8')
+                    self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+                    self.wfile.flush()
+
+                for i, piece in enumerate(pieces + [None]):
+                    delta = {'content': piece} if piece is not None else {}
+                    if i == 0:
+                        delta['role'] = 'assistant'
+                    send_event(json.dumps({
+                        'id': completion['id'],
+                        'object': 'chat.completion.chunk',
+                        'created': completion['created'],
+                        'model': completion['model'],
+                        'choices': [{
+                            'index': 0,
+                            'delta': delta,
+                            'finish_reason': None if piece is not None else 'stop'
+                        }]
+                    }))
+                    if piece is not None:
+                        time.sleep(latency / len(pieces))
+                send_event('[DONE]')
+                self.wfile.write(b"0\r\n\r\n")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    @staticmethod
+    def verbose_transcription(text: str) -> dict:
+        """Whisper's verbose_json shape, with one segment covering the whole chunk"""
+        return {
+            'task': 'transcribe',
+            'language': 'english',
+            'duration': 10.0,
+            'text': text,
+            'segments': [{'id': 0, 'start': 0.0, 'end': 10.0, 'text': text}],
+        }
+
+    @staticmethod
+    def speech_transcription(duration: float, words_per_minute: int, seed: int) -> dict:
+        """verbose_json of made-up lecture speech, one segment per sentence"""
+        rng = random.Random(seed)
+        seconds_per_word = 60 / words_per_minute
+        segments = []
+        start = 0.0
+        while start < duration:
+            words = [rng.choice(SPEECH_WORDS) for _ in range(rng.randint(6, 20))]
+            end = min(duration, start + len(words) * seconds_per_word)
+            text = ' '.join(words).capitalize() + rng.choice('..?')
+            segments.append({'id': len(segments), 'start': round(start, 2), 'end': round(end, 2), 'text': text})
+            start = end
+        return {
+            'task': 'transcribe',
+            'language': 'english',
+            'duration': duration,
+            'text': ' '.join(segment['text'] for segment in segments),
+            'segments': segments,
+        }
+
+    @staticmethod
+    def chat_completion(request: dict) -> dict:
+        """Echo the last user message back as the completion"""
+        prompt = request['messages'][-1]['content']
+        reply = prompt.split('\n\n', 1)[-1]
+        prompt_tokens = sum(len(m['content']) for m in request['messages']) // 4
+        completion_tokens = len(reply) // 4
+        return {
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': reply},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        }
+
+    def start(self) -> 'OpenAIStub':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,45 @@
+"""Check that tasks run with their own request and the app context.
+
+Usage: python -m benchmarks.task_context
+
+A bound probe task reports self.request.id and whether current_app is set.
+It runs once with apply(), the way tasks run eagerly, and once through a
+threaded worker on an in-memory broker, the way the real worker runs
+them. Both must report the id the task was sent with, which progress
+events and chunk storage are keyed by.
+"""
+import uuid
+from flask import current_app, has_app_context
+from app.celery_app import celery
+
+@celery.task(bind=True)
+def probe_request(self):
+    return {'id': self.request.id, 'app': has_app_context() and current_app.name}
+
+def check(mode: str, task_id: str, result: dict) -> list:
+    problems = []
+    if result['id'] != task_id:
+        problems.append(f"{mode}: self.request.id is {result['id']!r}, expected {task_id!r}")
+    if not result['app']:
+        problems.append(f"{mode}: no app context")
+    return problems
+
+def main():
+    # Set before the backend is first used, which caches it
+    celery.conf.broker_url = 'memory://'
+    celery.conf.result_backend = 'cache+memory://'
+    problems = []
+    task_id = str(uuid.uuid4())
+    problems += check('apply', task_id, probe_request.apply(task_id=task_id).get())
+
+    from celery.contrib.testing.worker import start_worker
+    with start_worker(celery, pool='threads', concurrency=1, perform_ping_check=False, loglevel='WARNING'):
+        task_id = str(uuid.uuid4())
+        problems += check('worker', task_id, probe_request.apply_async(task_id=task_id).get(timeout=30))
+
+    for problem in problems:
+        print(f"  {problem}")
+    print('FAILED' if problems else 'OK')
+
+if __name__ == '__main__':
+    main()
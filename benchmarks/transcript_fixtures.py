@@ -0,0 +1,84 @@
+"""Fill a storage directory with synthetic transcripts for load tests.
+
+Usage: python -m benchmarks.transcript_fixtures STORAGE_DIR --count 5000
+
+Markdown transcripts are written to STORAGE_DIR/transcripts the way the app
+renders them, spread over the past year, some with a Chinese section. They
+are indexed in STORAGE_DIR/catalog.sqlite3, so the app started with that
+storage directory serves them straight away. Compressed copies for /raw
+downloads are only written with --precompress, which takes far longer.
+"""
+import os
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+from config import Config
+from app.catalog import TranscriptCatalog, DATE_FORMAT
+from app.downloads import precompress_file
+from app.transcripts import CHINESE_HEADING
+from benchmarks.chunking import ENGLISH_SENTENCES, CHINESE_SENTENCES
+
+def paragraphs(rng: random.Random, sentences, count: int, joiner: str) -> str:
+    return '\n\n'.join(joiner.join(rng.choice(sentences) for _ in range(8)) for _ in range(count))
+
+def render_transcript(rng: random.Random, name: str, created: datetime, words: int, bilingual: bool) -> str:
+    # Each paragraph of eight English sentences holds about 120 words
+    count = max(1, words // 120)
+    content = f"""# Transcript: {name}
+Generated on: {created.strftime(DATE_FORMAT)}
+
+## English Content
+
+{paragraphs(rng, ENGLISH_SENTENCES, count, ' ')}
+"""
+    if bilingual:
+        content += f"""
+{CHINESE_HEADING}
+
+{paragraphs(rng, CHINESE_SENTENCES, count, '')}
+"""
+    return content
+
+def make_fixtures(storage_dir: str, count: int, min_words: int = 1000, max_words: int = 10000,
+                  bilingual: float = 0.5, seed: int = 0, precompress_min_bytes: int = None) -> list:
+    """Write count transcripts under storage_dir and index them, returning their filenames"""
+    rng = random.Random(seed)
+    transcripts_dir = os.path.join(storage_dir, 'transcripts')
+    os.makedirs(transcripts_dir, exist_ok=True)
+    now = datetime.now().replace(microsecond=0)
+    filenames = []
+    for i in range(count):
+        created = now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        filename = f"lecture_{i:05d}_{created.strftime('%Y%m%d_%H%M%S')}.md"
+        content = render_transcript(rng, f"lecture_{i:05d}.mp3", created, rng.randint(min_words, max_words),
+                                    rng.random() < bilingual)
+        file_path = os.path.join(transcripts_dir, filename)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        if precompress_min_bytes is not None:
+            precompress_file(file_path, precompress_min_bytes)
+        filenames.append(filename)
+
+    TranscriptCatalog(os.path.join(storage_dir, 'catalog.sqlite3')).rebuild(transcripts_dir)
+    return filenames
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('storage_dir')
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--min-words', type=int, default=1000)
+    parser.add_argument('--max-words', type=int, default=10000)
+    parser.add_argument('--bilingual', type=float, default=0.5, help='share of transcripts with a Chinese section')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--precompress', action='store_true', help='also write gzip and brotli copies')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    make_fixtures(args.storage_dir, args.count, args.min_words, args.max_words, args.bilingual, args.seed,
+                  Config.PRECOMPRESS_MIN_BYTES if args.precompress else None)
+    print(f"Wrote and indexed {args.count} transcripts in {args.storage_dir} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Stress concurrent layer updates of the same transcripts from many processes.
+
+Usage: python -m benchmarks.transcript_writes --processes 8 --updates 50
+
+Every process updates random layers of a few shared transcripts, half of
+them legacy markdown files imported on their first update. Right after an
+update the markdown downloaded must contain it, unless the same layer was
+overwritten meanwhile. Afterwards each markdown file must match its layers,
+every layer must hold a value that was written, and no lock or temporary
+file may be left behind.
+
+Run with --no-lock to see the checks fail without the transcript lock.
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+from config import Config
+from app import create_app
+from app import transcripts
+from app.transcripts import create_transcript, update_layer, read_layer, render_markdown, markdown_path, markdown_file
+
+UPDATE_LAYERS = ('processed', 'chinese')
+
+def make_config(storage_dir: str):
+    class StressConfig(Config):
+        STORAGE_DIR = storage_dir
+        TRANSCRIPTS_DIR = os.path.join(storage_dir, 'transcripts')
+        TRANSCRIPT_RECORDS_DIR = os.path.join(storage_dir, 'records')
+        CATALOG_PATH = os.path.join(storage_dir, 'catalog.sqlite3')
+        TEMP_DIR = os.path.join(storage_dir, 'temp')
+    return StressConfig
+
+def make_transcripts(app, count: int):
+    filenames = []
+    with app.app_context():
+        for i in range(count):
+            if i % 2:
+                # Saved before layers existed: only the markdown file is there
+                filename = f"legacy_{i}_20240101_000000.md"
+                with open(markdown_path(filename), 'w', encoding='utf-8') as f:
+                    f.write(f"# Transcript: legacy_{i}.mp3\nGenerated on: 2024-01-01 00:00:00\n\n"
+                            f"## English Content\n\nlegacy english {i}\n")
+            else:
+                filename = os.path.basename(create_transcript(f"lecture_{i}.mp3", f"english {i}"))
+            filenames.append(filename)
+    return filenames
+
+def worker(storage_dir: str, filenames: list, updates: int, seed: int, use_lock: bool, lost):
+    app = create_app(make_config(storage_dir))
+    if not use_lock:
+        transcripts.transcript_lock = lambda filename: contextlib.nullcontext()
+    rng = random.Random(seed)
+    with app.app_context():
+        for i in range(updates):
+            filename = rng.choice(filenames)
+            layer = rng.choice(UPDATE_LAYERS)
+            text = f"{layer} from worker {seed} update {i}"
+            update_layer(filename, layer, text)
+            with open(markdown_file(filename), 'r', encoding='utf-8') as f:
+                published = f.read()
+            # Texts are unique, so a layer still holding ours means no writer replaced it
+            if text not in published and read_layer(filename, layer) == text:
+                with lost.get_lock():
+                    lost.value += 1
+
+def check(app, filenames: list, processes: int, updates: int) -> list:
+    written = {f"{layer} from worker {seed} update {i}"
+               for layer in UPDATE_LAYERS for seed in range(processes) for i in range(updates)}
+    problems = []
+    with app.app_context():
+        for filename in filenames:
+            for layer in UPDATE_LAYERS:
+                text = read_layer(filename, layer)
+                if text is not None and text not in written:
+                    problems.append(f"{filename}: {layer} layer holds {text!r}")
+            with open(markdown_file(filename), 'r', encoding='utf-8') as f:
+                if f.read() != render_markdown(filename):
+                    problems.append(f"{filename}: markdown does not match its layers")
+
+    for root, _, files in os.walk(app.config['STORAGE_DIR']):
+        for name in files:
+            if name.endswith('.lock') or '.lock.' in name or name.startswith('tmp'):
+                problems.append(f"left behind: {os.path.join(root, name)}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--updates', type=int, default=50, help='updates per process')
+    parser.add_argument('--transcripts', type=int, default=4)
+    parser.add_argument('--no-lock', action='store_true', help='update without the transcript lock')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        app = create_app(make_config(storage_dir))
+        filenames = make_transcripts(app, args.transcripts)
+
+        lost = multiprocessing.Value('i', 0)
+        start = time.perf_counter()
+        procs = [multiprocessing.Process(target=worker,
+                                         args=(storage_dir, filenames, args.updates, seed, not args.no_lock, lost))
+                 for seed in range(args.processes)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        wall = time.perf_counter() - start
+
+        total = args.processes * args.updates
+        failed = sum(1 for proc in procs if proc.exitcode != 0)
+        print(f"{total} updates of {args.transcripts} transcripts from {args.processes} processes "
+              f"in {wall:.2f}s ({total / wall:.0f}/s)")
+        problems = check(app, filenames, args.processes, args.updates)
+        if lost.value:
+            problems.append(f"{lost.value} updates missing from the markdown downloaded after them")
+        if failed:
+            problems.append(f"{failed} worker processes failed")
+        for problem in problems:
+            print(f"  {problem}")
+        print('FAILED' if problems else 'OK')
+
+if __name__ == '__main__':
+    main()
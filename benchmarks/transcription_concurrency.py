@@ -0,0 +1,48 @@
+"""Benchmark the Whisper chunk stage against a local stub with fixed latency.
+
+Usage: python -m benchmarks.transcription_concurrency --chunks 6 --delay 0.5
+
+Wall time should scale with ceil(chunks / concurrency) * delay rather than
+with chunks * delay.
+"""
+import os
+import math
+import time
+import argparse
+import tempfile
+from openai import OpenAI
+from app.tasks import transcribe_chunks_concurrently
+from benchmarks.openai_stub import OpenAIStub
+
+def make_chunk_files(directory: str, count: int, size: int):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"chunk_{i:04d}.mp3")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chunks', type=int, nargs='+', default=[1, 6, 12])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--delay', type=float, default=0.5, help='stub latency per request in seconds')
+    parser.add_argument('--chunk-bytes', type=int, default=256 * 1024)
+    args = parser.parse_args()
+
+    with OpenAIStub(delay=args.delay) as stub, tempfile.TemporaryDirectory() as tmp:
+        client = OpenAI(api_key='stub', base_url=stub.base_url, max_retries=0)
+        print(f"{'chunks':>6} {'workers':>7} {'wall (s)':>9} {'expected (s)':>12}")
+        for chunk_count in args.chunks:
+            paths = make_chunk_files(tmp, chunk_count, args.chunk_bytes)
+            for workers in args.concurrency:
+                start = time.perf_counter()
+                transcripts = transcribe_chunks_concurrently(client, ((p, 0.0) for p in paths), workers)
+                wall = time.perf_counter() - start
+                assert len(transcripts) == chunk_count
+                expected = math.ceil(chunk_count / workers) * args.delay
+                print(f"{chunk_count:>6} {workers:>7} {wall:>9.2f} {expected:>12.2f}")
+
+if __name__ == '__main__':
+    main()
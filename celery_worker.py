@@ -1,5 +1,4 @@
-from app import create_app
-from app.celery_app import celery
+from app.celery_app import celery, get_worker_app
 
-app = create_app()
-app.app_context().push() 
\ No newline at end of file
+app = get_worker_app()
+app.app_context().push()
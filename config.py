@@ -11,8 +11,82 @@ class Config:
     STORAGE_DIR = os.path.join(BASE_DIR, 'app', 'storage')
     TEMP_DIR = os.path.join(STORAGE_DIR, 'temp')
     TRANSCRIPTS_DIR = os.path.join(STORAGE_DIR, 'transcripts')
+    CATALOG_PATH = os.path.join(STORAGE_DIR, 'catalog.sqlite3')  # Index of TRANSCRIPTS_DIR
+    # Per-transcript layers and timed segments; the markdown files are rendered from them on download
+    TRANSCRIPT_RECORDS_DIR = os.path.join(STORAGE_DIR, 'records')
+    TRANSCRIPT_LOCK_TIMEOUT = 30  # Seconds to wait for another writer of the same transcript
+    TRANSCRIPT_LOCK_STALE_SECONDS = 120  # Locks older than this were left by a crashed writer
+    TRANSCRIPTS_PAGE_SIZE = 50
+    TRANSCRIPTS_MAX_PAGE_SIZE = 500
+    SEARCH_PAGE_SIZE = 20
+    PRECOMPRESS_MIN_BYTES = 1024  # Smaller transcripts are sent uncompressed
     MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500MB max-size for upload
+    MAX_UPLOAD_SIZE = 4 * 1024 * 1024 * 1024  # 4GB max-size for resumable uploads
+    UPLOAD_PART_SIZE = 8 * 1024 * 1024  # 8MB per resumable upload part
+    UPLOAD_EXPIRY_SECONDS = 24 * 3600  # Resumable uploads without a new part for this long are removed
+    MAX_OPEN_UPLOADS = 3  # Resumable uploads in progress per session, each preallocated to its full size
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+    # Each process shares one OpenAI client, whose connections are kept alive between tasks
+    OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 100))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 20))
+    OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get('OPENAI_KEEPALIVE_EXPIRY', 60))
+    OPENAI_HTTP2 = os.environ.get('OPENAI_HTTP2', '').lower() in ('1', 'true', 'yes')  # Needs the h2 package
+
+    # OpenAI quota for chat completions, per process
+    OPENAI_REQUESTS_PER_MINUTE = int(os.environ.get('OPENAI_REQUESTS_PER_MINUTE', 500))
+    OPENAI_TOKENS_PER_MINUTE = int(os.environ.get('OPENAI_TOKENS_PER_MINUTE', 30000))
+
+    # Audio chunking: chunks are sized to fit just under Whisper's upload limit
+    WHISPER_MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+    AUDIO_TARGET_BIT_RATE = int(os.environ.get('AUDIO_TARGET_BIT_RATE', 24000))  # Speech-grade Opus
+    AUDIO_MAX_CHUNK_SECONDS = int(os.environ.get('AUDIO_MAX_CHUNK_SECONDS', 0))  # 0 = limited by size only
+    # Snap chunk boundaries to pauses and repeat a little audio across each seam
+    AUDIO_ALIGN_TO_SILENCE = os.environ.get('AUDIO_ALIGN_TO_SILENCE', 'true').lower() in ('1', 'true', 'yes')
+    AUDIO_SILENCE_SEARCH_SECONDS = 30
+    AUDIO_CHUNK_OVERLAP_SECONDS = float(os.environ.get('AUDIO_CHUNK_OVERLAP_SECONDS', 3))
+
+    # Whisper requests in flight per transcription task
+    TRANSCRIPTION_CONCURRENCY = int(os.environ.get('TRANSCRIPTION_CONCURRENCY', 4))
+
+    # Fan each chunk out as its own Celery task. CHUNKS_DIR must live on
+    # storage that every worker can read (e.g. an NFS mount).
+    TRANSCRIPTION_FANOUT = os.environ.get('TRANSCRIPTION_FANOUT', '').lower() in ('1', 'true', 'yes')
+    CHUNKS_DIR = os.environ.get('CHUNKS_DIR') or os.path.join(STORAGE_DIR, 'chunks')
+
+    # Transcripts cached by audio content hash, evicted LRU past the size limit
+    TRANSCRIPT_CACHE_DIR = os.path.join(STORAGE_DIR, 'cache', 'transcripts')
+    TRANSCRIPT_CACHE_MAX_BYTES = int(os.environ.get('TRANSCRIPT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+    # Text chunks sent to the LLM are measured in tokens of this encoding (gpt-4o)
+    TOKENIZER_ENCODING = os.environ.get('TOKENIZER_ENCODING', 'o200k_base')
+    # Chinese output runs ~1.5x the English input, which keeps replies well under 4096 tokens
+    TRANSLATION_CHUNK_TOKENS = int(os.environ.get('TRANSLATION_CHUNK_TOKENS', 1200))
+    FORMAT_CHUNK_TOKENS = int(os.environ.get('FORMAT_CHUNK_TOKENS', 2000))
+    # Several chunks share one request up to these input budgets, sized so the
+    # reply fits gpt-4o's 16384 output tokens with the same expansion as above
+    TRANSLATION_BATCH_TOKENS = int(os.environ.get('TRANSLATION_BATCH_TOKENS', 8000))
+    FORMAT_BATCH_TOKENS = int(os.environ.get('FORMAT_BATCH_TOKENS', 12000))
+    LLM_BATCH_MIN_PARALLEL = int(os.environ.get('LLM_BATCH_MIN_PARALLEL', 4))  # Batches kept in flight at once
+
+    # Cache for /translate and /process chunk completions ('redis' or 'sqlite')
+    LLM_CACHE_BACKEND = os.environ.get('LLM_CACHE_BACKEND', 'redis')
+    LLM_CACHE_REDIS_URL = 'redis://localhost:6379/2'
+    LLM_CACHE_SQLITE_PATH = os.path.join(STORAGE_DIR, 'cache', 'llm.sqlite3')
+    LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 7 * 24 * 3600))
+    LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 100000))
+
+    # Progress events pushed to clients over Server-Sent Events
+    EVENTS_REDIS_URL = 'redis://localhost:6379/3'
+    EVENTS_TTL = 3600  # Event history kept for late subscribers, as long as task results
+    EVENTS_KEEPALIVE_SECONDS = 15
+    STREAM_FLUSH_SECONDS = 0.1  # Streamed LLM text is relayed in bursts at most this far apart
+    # Per-chunk transcript text, readable while a job is still running
+    PARTIAL_RESULTS_REDIS_URL = 'redis://localhost:6379/0'  # The Celery result backend
+    PARTIAL_RESULTS_PAGE_SIZE = 50
+
+    # Traces are exported over OTLP/HTTP when set, e.g. http://localhost:4318 for a local collector
+    OTLP_ENDPOINT = os.environ.get('OTEL_EXPORTER_OTLP_ENDPOINT')
+    TRACING_SERVICE_NAME = os.environ.get('OTEL_SERVICE_NAME', 'transcriber')
 
     # Redis configuration for Celery
     CELERY_BROKER_URL = 'redis://localhost:6379/0'
@@ -1,11 +1,15 @@
 from hypercorn.config import Config
 from hypercorn.asyncio import serve
+from hypercorn.middleware import AsyncioWSGIMiddleware
 import asyncio
 from app import create_app
+from app.events import EventStreamMiddleware
 
 app = create_app()
 
 if __name__ == '__main__':
     config = Config()
     config.bind = ["localhost:5001"]
-    asyncio.run(serve(app, config)) 
\ No newline at end of file
+    # Event streams are served natively on the event loop, everything else by Flask
+    asgi_app = EventStreamMiddleware(AsyncioWSGIMiddleware(app, config.wsgi_max_body_size))
+    asyncio.run(serve(asgi_app, config)) 
\ No newline at end of file